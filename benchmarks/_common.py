@@ -0,0 +1,27 @@
+"""
+Shared helpers for the offline benchmarks
+"""
+
+import asyncio
+
+class FakeBot:
+    """Just enough of commands.Bot for the cogs to run offline"""
+    command_prefix = '!'
+    
+    def __init__(self, config=None):
+        self.config = config if config is not None else {}
+    
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+    
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()  # Never ready, so background tasks stay idle
+    
+    def is_closed(self):
+        return False
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of pre-sorted samples"""
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
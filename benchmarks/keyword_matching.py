@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Keyword Matching Benchmark
+Runs the Keywords cog matching path offline against synthetic messages
+and compares throughput with a stored baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import FakeBot, percentile
+from cogs.keywords import Keywords, KeywordShard
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'keyword_matching.json')
+TABLE_SIZES = (10, 1000, 10000)
+GUILD_ID = 1
+
+COMMON_WORDS = (
+    "the be to of and a in that have i it for not on with he as you do at this but his by from they we say "
+    "her she or an will my one all would there their what so up out if about who get which go me when make "
+    "can like time no just him know take people into year your good some could them see other than then now "
+    "look only come its over think also back after use two how our work first well way even new want because "
+    "any these give day most us lol gg brb idk tbh ngl game server discord voice chat anyone online tonight"
+).split()
+
+class FakeChannel:
+    """Text channel that counts sends instead of calling the API"""
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+    
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+def make_keywords(size, rng):
+    """Build a keyword table of unique one to three word phrases"""
+    keywords = {}
+    while len(keywords) < size:
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(rng.randint(1, 3))]
+        if len(words) > 1 and rng.random() < 0.3:
+            words[0] = rng.choice(COMMON_WORDS)  # Phrases like "good morning"
+        keywords.setdefault(' '.join(words), [f"Response {len(keywords)}"])
+    return keywords
+
+def make_corpus(keywords, count, hit_ratio, rng):
+    """Build chat-like messages, a fraction of which contain a keyword"""
+    keyword_list = list(keywords)
+    corpus = []
+    for _ in range(count):
+        words = rng.choices(COMMON_WORDS, k=rng.randint(2, 25))
+        if rng.random() < hit_ratio:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keyword_list).upper() if rng.random() < 0.3 else rng.choice(keyword_list))
+        corpus.append(' '.join(words))
+    return corpus
+
+def summarize(samples_ns):
+    """Throughput and latency percentiles from per-message timings"""
+    samples = sorted(samples_ns)
+    total_seconds = sum(samples) / 1e9
+    return {
+        'messages_per_sec': round(len(samples) / total_seconds, 1),
+        'p50_us': round(percentile(samples, 0.50) / 1000, 2),
+        'p99_us': round(percentile(samples, 0.99) / 1000, 2)
+    }
+
+async def run_size(size, messages, hit_ratio, seed):
+    """Benchmark the matcher and the full on_message path for one table size"""
+    rng = random.Random(seed + size)
+    keywords = make_keywords(size, rng)
+    corpus = make_corpus(keywords, messages, hit_ratio, rng)
+    
+    bot = FakeBot()
+    cog = Keywords(bot)
+    cog.shards[GUILD_ID] = KeywordShard(GUILD_ID, keywords, {})
+    matcher = cog.shards[GUILD_ID].matcher
+    
+    # Bare matcher: lowercase plus scan
+    matcher_samples = []
+    for content in corpus:
+        start = time.perf_counter_ns()
+        matcher.find(content.lower())
+        matcher_samples.append(time.perf_counter_ns() - start)
+    
+    # Full listener path with fake messages
+    author = types.SimpleNamespace(bot=False, id=42)
+    guild = types.SimpleNamespace(id=GUILD_ID, name="Benchmark")
+    channels = [FakeChannel(channel_id) for channel_id in range(10)]
+    listener_samples = []
+    for index, content in enumerate(corpus):
+        message = types.SimpleNamespace(content=content, author=author, guild=guild, channel=channels[index % len(channels)])
+        start = time.perf_counter_ns()
+        await cog.on_message(message)
+        listener_samples.append(time.perf_counter_ns() - start)
+    
+    cog.stats_task.cancel()
+    return {
+        'matcher': summarize(matcher_samples),
+        'on_message': summarize(listener_samples),
+        'replies_sent': sum(channel.sent for channel in channels)
+    }
+
+def compare(results, baseline, tolerance):
+    """Report throughput changes against the baseline and return regressions"""
+    regressions = []
+    for size, result in results.items():
+        previous = baseline.get(size)
+        if not previous:
+            continue
+        for path in ('matcher', 'on_message'):
+            before = previous[path]['messages_per_sec']
+            after = result[path]['messages_per_sec']
+            change = (after - before) / before * 100
+            print(f"  {size:>6} keywords {path:<10} {before:>12,.0f} -> {after:>12,.0f} msg/s ({change:+.1f}%)")
+            if after < before * (1 - tolerance):
+                regressions.append(f"{size} keywords {path}: {change:+.1f}%")
+    return regressions
+
+async def main():
+    """Run the benchmark and compare or update the baseline"""
+    parser = argparse.ArgumentParser(description="Benchmark keyword matching throughput")
+    parser.add_argument('--messages', type=int, help="messages per table size (default: the baseline's, else 20000)")
+    parser.add_argument('--hit-ratio', type=float, help="fraction of messages containing a keyword (default: the baseline's, else 0.05)")
+    parser.add_argument('--seed', type=int, help="corpus seed (default: the baseline's, else 1234)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed throughput drop before failing")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    args = parser.parse_args()
+    
+    # Results are only comparable with a baseline run on the same corpus
+    baseline = None
+    if not args.update_baseline and os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r') as f:
+            baseline = json.load(f)
+    defaults = baseline or {}
+    mismatched = []
+    for name, default in (('messages', 20000), ('hit_ratio', 0.05), ('seed', 1234)):
+        if getattr(args, name) is None:
+            setattr(args, name, defaults.get(name, default))
+        elif baseline is not None and getattr(args, name) != baseline.get(name):
+            mismatched.append(f"{name}={getattr(args, name)} (baseline {baseline.get(name)})")
+    if mismatched:
+        print(f"Run parameters differ from the baseline: {', '.join(mismatched)}")
+        print("Rerun without them to compare, or add --update-baseline to record a new baseline")
+        return 1
+    
+    # The cog creates its data files relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix='keyword-bench-'))
+    os.makedirs('data', exist_ok=True)
+    
+    results = {}
+    for size in TABLE_SIZES:
+        result = await run_size(size, args.messages, args.hit_ratio, args.seed)
+        results[str(size)] = result
+        for path in ('matcher', 'on_message'):
+            stats = result[path]
+            print(f"{size:>6} keywords {path:<10} {stats['messages_per_sec']:>12,.0f} msg/s  "
+                  f"p50 {stats['p50_us']:>8.2f}µs  p99 {stats['p99_us']:>8.2f}µs")
+    
+    if baseline is None:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'messages': args.messages, 'hit_ratio': args.hit_ratio, 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"Baseline written to {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return 0
+    
+    print("Compared with baseline:")
+    regressions = compare(results, baseline.get('results', {}), args.tolerance)
+    if regressions:
+        print("Throughput regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+TTS Playback CPU Benchmark
+Measures CPU time per second of audio for one voice stream on the PCM
+path (FFmpeg decodes, discord.py Opus-encodes every frame) and on the
+Opus passthrough path used for cached TTS clips, to size hosts
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import discord
+from discord import opus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cogs.tts import encode_opus
+
+FRAME_SECONDS = opus.Encoder.FRAME_LENGTH / 1000
+
+def make_clip(directory, seconds):
+    """Write an mp3 test clip and its cached Opus form"""
+    mp3_filename = os.path.join(directory, 'clip.mp3')
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', f'anoisesrc=d={seconds}:a=0.1',
+         '-ac', '1', '-ar', '24000', '-b:a', '32k', mp3_filename],
+        check=True
+    )
+    opus_filename = os.path.join(directory, 'clip.opus')
+    encode_opus(mp3_filename, opus_filename)
+    return mp3_filename, opus_filename
+
+def play_pcm(filename):
+    """Drain a clip the way discord.py plays a PCM source; returns audio seconds"""
+    source = discord.FFmpegPCMAudio(filename)
+    encoder = opus.Encoder()
+    frames = 0
+    while True:
+        data = source.read()
+        if not data:
+            break
+        encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        frames += 1
+    source.cleanup()
+    return frames * FRAME_SECONDS
+
+def play_opus(filename):
+    """Drain a cached Opus clip the way discord.py plays a passthrough source"""
+    source = discord.FFmpegOpusAudio(filename, codec='copy')
+    frames = 0
+    while source.read():
+        frames += 1
+    source.cleanup()
+    return frames * FRAME_SECONDS
+
+def cpu_seconds():
+    """CPU time of this process plus its finished FFmpeg children"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def measure(play, filename, streams):
+    """Play one clip on several threads at once and return CPU seconds per audio second"""
+    audio = [0.0] * streams
+    def worker(index):
+        audio[index] = play(filename)
+    
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(streams)]
+    cpu_before = cpu_seconds()
+    wall_before = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_before
+    return (cpu_seconds() - cpu_before) / sum(audio), sum(audio) / wall
+
+def main():
+    """Measure both playback paths and print the CPU cost per stream"""
+    parser = argparse.ArgumentParser(description="Measure CPU per TTS voice stream")
+    parser.add_argument('--seconds', type=int, default=30, help="length of the test clip")
+    parser.add_argument('--streams', type=int, default=4, help="clips played at the same time")
+    args = parser.parse_args()
+    
+    if not shutil.which('ffmpeg'):
+        print("FFmpeg is required for this benchmark")
+        return 1
+    if not opus.is_loaded() and not opus._load_default():
+        print("libopus is required for the PCM path (install libopus / opus)")
+        return 1
+    
+    directory = tempfile.mkdtemp(prefix='tts-cpu-')
+    mp3_filename, opus_filename = make_clip(directory, args.seconds)
+    results = {
+        'pcm': measure(play_pcm, mp3_filename, args.streams),
+        'opus': measure(play_opus, opus_filename, args.streams)
+    }
+    shutil.rmtree(directory)
+    
+    # A realtime stream needs one second of audio per second, so CPU per audio second is the share of a core
+    for path, (cpu_per_audio_second, speed) in results.items():
+        per_stream = cpu_per_audio_second * 100
+        print(f"{path:<5} {per_stream:>6.2f}% of a core per stream  "
+              f"~{1 / cpu_per_audio_second:>7.0f} streams per core  ({speed:.0f}x realtime)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+TTS Engine Benchmark
+Measures synthesis latency for each TTS engine through the cog's shared
+worker pool. Local engines run without network access; gTTS is only
+included with --network
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import FakeBot, percentile
+from cogs.tts import TTS, TTS_ENGINES
+
+LOCAL_ENGINES = ('espeak', 'piper')
+
+SENTENCES = (
+    "Hello everyone, welcome to the server.",
+    "The giveaway ends in ten minutes, good luck!",
+    "Can someone mute their microphone please?",
+    "I will be right back, grabbing some food.",
+    "That was a great game, well played.",
+    "Remember to read the rules channel before posting.",
+    "Voice chat starts at eight tonight.",
+    "Does anyone know how to fix this error?"
+)
+
+async def run_engine(cog, engine, texts):
+    """Synthesize every text concurrently through the worker pool"""
+    async def timed(text):
+        start = time.perf_counter()
+        data = await cog.synthesize(engine, text)
+        return time.perf_counter() - start, len(data)
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(text) for text in texts))
+    wall = time.perf_counter() - start
+    samples = sorted(seconds for seconds, _ in results)
+    return {
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'per_sec': len(texts) / wall,
+        'kb_per_clip': sum(size for _, size in results) / len(results) / 1024
+    }
+
+async def main():
+    """Benchmark every available engine on the same utterances"""
+    parser = argparse.ArgumentParser(description="Benchmark TTS engine latency")
+    parser.add_argument('--engines', nargs='+', choices=sorted(TTS_ENGINES), help="engines to run (default: local engines)")
+    parser.add_argument('--network', action='store_true', help="also benchmark gTTS, which needs network access")
+    parser.add_argument('--utterances', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4, help="size of the shared synthesis pool")
+    parser.add_argument('--piper-model', help="piper voice model (.onnx)")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    
+    engines = args.engines or list(LOCAL_ENGINES) + (['gtts'] if args.network else [])
+    rng = random.Random(args.seed)
+    texts = [rng.choice(SENTENCES) for _ in range(args.utterances)]
+    
+    # The cog creates its cache directory relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix='tts-engines-'))
+    os.makedirs('data', exist_ok=True)
+    config = {'tts_workers': args.workers, 'tts_synth_timeout': 60, 'tts_piper_model': args.piper_model}
+    cog = TTS(FakeBot(config))
+    
+    ran = 0
+    for name in engines:
+        try:
+            engine = TTS_ENGINES[name](config)
+        except RuntimeError as e:
+            print(f"{name:<7} skipped: {e}")
+            continue
+        try:
+            result = await run_engine(cog, engine, texts)
+        except Exception as e:
+            print(f"{name:<7} failed: {type(e).__name__}: {e}")
+            continue
+        ran += 1
+        print(f"{name:<7} p50 {result['p50_ms']:>8.1f}ms  p99 {result['p99_ms']:>8.1f}ms  "
+              f"{result['per_sec']:>6.1f} clips/s  {result['kb_per_clip']:>6.1f} KB/clip")
+    
+    cog.cog_unload()
+    return 0 if ran else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+TTS Streaming Benchmark
+Compares the in-memory and temp-file TTS audio paths offline: time to
+first audio and bytes written to disk per utterance
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import FakeBot, percentile
+from cogs import tts as tts_module
+from cogs.tts import TTS
+
+MODES = ('memory', 'file')
+
+def sample_mp3():
+    """Two seconds of mp3 audio, encoded by FFmpeg when it is installed"""
+    if shutil.which('ffmpeg'):
+        result = subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=2', '-f', 'mp3', 'pipe:1'],
+            capture_output=True
+        )
+        if result.returncode == 0 and result.stdout:
+            return result.stdout
+    return os.urandom(32 * 1024)  # Roughly the size of a short gTTS clip
+
+def disk_writes():
+    """Bytes this process has written through write() calls so far"""
+    counters = psutil.Process().io_counters()
+    return getattr(counters, 'write_chars', counters.write_bytes)
+
+async def run_mode(mode, texts, audio, synth_latency, decode):
+    """Time each utterance from request to first audio frame in one mode"""
+    config = {'tts_audio_mode': mode, 'tts_synth_timeout': 60}
+    cog = TTS(FakeBot(config))
+    engine = types.SimpleNamespace(name='benchmark', voice='benchmark', spawns_process=False)
+    
+    def render_speech(engine, text, filename=None):
+        time.sleep(synth_latency)
+        if filename is not None:
+            with open(filename, 'wb') as f:
+                f.write(audio)
+            return None, synth_latency
+        return audio, synth_latency
+    cog.render_speech = render_speech
+    
+    samples = []
+    writes_before = disk_writes()
+    for text in texts:
+        start = time.perf_counter()
+        clip = await cog.prepare_audio(text, engine)
+        if decode:
+            source = clip.source()
+            source.read()  # First 20ms PCM frame out of FFmpeg
+            source.cleanup()
+        samples.append(time.perf_counter() - start)
+    
+    # Let background cache writes land before counting bytes; the cog's monitor and
+    # idle timer tasks run until unload, so only the clip writes are awaited
+    await asyncio.gather(*cog.cache_tasks)
+    written = disk_writes() - writes_before
+    cached = len(cog.cache.index)
+    cog.cog_unload()
+    
+    samples.sort()
+    return {
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'kb_per_utterance': written / len(texts) / 1024,
+        'cached_clips': cached
+    }
+
+async def main():
+    """Run both modes over the same utterances and print a comparison"""
+    parser = argparse.ArgumentParser(description="Benchmark in-memory vs temp-file TTS audio")
+    parser.add_argument('--utterances', type=int, default=200)
+    parser.add_argument('--repeat-ratio', type=float, default=0.3, help="fraction of utterances that repeat earlier text")
+    parser.add_argument('--synth-latency', type=float, default=0.0, help="simulated synthesis time in seconds")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    texts = []
+    for index in range(args.utterances):
+        if texts and rng.random() < args.repeat_ratio:
+            texts.append(rng.choice(texts))
+        else:
+            texts.append(f"utterance number {index}")
+    
+    audio = sample_mp3()
+    decode = shutil.which('ffmpeg') is not None
+    if not decode:
+        print("FFmpeg not found: timing up to a playable clip, without decoding the first frame, "
+              "and caching clips without Opus encoding")
+        def copy_clip(source, filename):
+            if not isinstance(source, bytes):
+                with open(source, 'rb') as f:
+                    source = f.read()
+            with open(filename, 'wb') as f:
+                f.write(source)
+        tts_module.encode_opus = copy_clip
+    
+    for mode in MODES:
+        # Each mode starts from an empty cache in its own working directory
+        os.chdir(tempfile.mkdtemp(prefix=f'tts-bench-{mode}-'))
+        os.makedirs('data', exist_ok=True)
+        result = await run_mode(mode, texts, audio, args.synth_latency, decode)
+        print(f"{mode:<7} first audio p50 {result['p50_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+              f"disk {result['kb_per_utterance']:>7.1f} KB/utterance  cached clips {result['cached_clips']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -56,7 +56,7 @@ class DiscordBot(commands.Bot):
                 "log_channel_id": None,
                 "mute_role_name": "Muted",
                 "max_giveaway_duration": 7200,  # 2 hours in seconds
-                "tts_max_length": 200
+                "tts_max_length": 1000
             }
             self.save_config()
         except json.JSONDecodeError:
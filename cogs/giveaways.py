@@ -2,47 +2,419 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
+import heapq
+from array import array
+from collections import OrderedDict
 import json
+import os
 import random
+import time
 from datetime import datetime, timedelta
 import logging
 
+GIVEAWAY_EMOJI = "🎉"
+ENTRANTS_DIR = 'data/giveaway_entrants'
+SNAPSHOT_PATH = 'data/giveaways.json'
+JOURNAL_PATH = 'data/giveaways.journal'
+ARCHIVE_PATH = 'data/giveaway_archive.jsonl'
+
+class AliasTable:
+    """Vose alias table over weighted entrants: O(n) to build, O(1) per draw
+    
+    Memory is a few flat arrays proportional to the number of unique users,
+    however many entries each of them has.
+    """
+    def __init__(self, entrants):
+        self.entrants = dict(entrants)  # user ID -> weight, copied so later entries can't skew draws
+        self.ids = array('Q', self.entrants.keys())
+        count = len(self.ids)
+        factor = count / sum(self.entrants.values()) if count else 0.0
+        scaled = [weight * factor for weight in self.entrants.values()]
+        prob = [1.0] * count  # Columns left over at the end are 1 up to rounding error
+        alias = list(range(count))
+        
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large[-1]
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(large.pop())
+        self.prob = array('d', prob)
+        self.alias = array('L', alias)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def draw(self, rng):
+        """One user ID, chosen with probability proportional to its weight"""
+        column = rng.randrange(len(self.ids))
+        return self.ids[column] if rng.random() < self.prob[column] else self.ids[self.alias[column]]
+    
+    def sample(self, count, exclude=(), rng=random):
+        """Up to count distinct user IDs, drawn by weight without replacement"""
+        exclude = {user_id for user_id in exclude if user_id in self.entrants}
+        count = min(count, len(self.entrants) - len(exclude))
+        winners = []
+        misses = 0
+        while len(winners) < count:
+            user_id = self.draw(rng)
+            if user_id in exclude:
+                # Repeats are rejected, which keeps draws weighted among those left; if a few
+                # heavy entrants keep getting hit, fall back to a table without them
+                misses += 1
+                if misses > 8 * count + 64:
+                    remaining = {i: w for i, w in self.entrants.items() if i not in exclude}
+                    return winners + AliasTable(remaining).sample(count - len(winners), rng=rng)
+                continue
+            exclude.add(user_id)
+            winners.append(user_id)
+        return winners
+
+class GiveawaySchedule:
+    """Min-heap of giveaway end times with lazy removal"""
+    def __init__(self):
+        self.heap = []  # (end timestamp, giveaway ID); entries that don't match deadlines are stale
+        self.deadlines = {}  # giveaway ID -> end timestamp
+        self.wake = asyncio.Event()  # Set when the earliest deadline may have changed
+    
+    def __len__(self):
+        return len(self.deadlines)
+    
+    def add(self, giveaway_id, end_time):
+        """Schedule (or reschedule) a giveaway to end at end_time"""
+        deadline = end_time.timestamp()
+        self.deadlines[giveaway_id] = deadline
+        heapq.heappush(self.heap, (deadline, giveaway_id))
+        self.wake.set()
+    
+    def remove(self, giveaway_id):
+        """Unschedule a giveaway; its heap entry is dropped when it reaches the top"""
+        if self.deadlines.pop(giveaway_id, None) is not None:
+            self.wake.set()
+            # Rebuild once stale entries dominate, so the heap stays proportional to live giveaways
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                self.heap = [(deadline, giveaway_id) for giveaway_id, deadline in self.deadlines.items()]
+                heapq.heapify(self.heap)
+    
+    def peek(self):
+        """(end timestamp, giveaway ID) of the next giveaway to end, or None"""
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+    
+    def pop(self):
+        """Remove and return the ID of the next giveaway to end"""
+        _, giveaway_id = heapq.heappop(self.heap)
+        del self.deadlines[giveaway_id]
+        return giveaway_id
+
 class Giveaways(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.journal_length = 0  # Events appended since the last snapshot
         self.giveaways = self.load_giveaways()
         
-        # Start giveaway checker task
+        # Entrants per giveaway (user ID -> entries), kept current from reaction events
+        os.makedirs(ENTRANTS_DIR, exist_ok=True)
+        self.entrants = {}
+        self.alias_tables = OrderedDict()  # Recently drawn giveaways, reused by rerolls
+        self.entrants_dirty = set()  # Giveaway IDs with changes not yet written
+        self.needs_reconcile = set()  # Giveaways whose reactions may have changed while we were offline
+        self.reconciling = {}  # giveaway ID -> reaction events seen during an in-progress reconciliation
+        self.reconcile_tasks = {}  # giveaway ID -> running reconciliation
+        for giveaway_id, giveaway in self.giveaways.items():
+            if giveaway['active']:
+                self.entrants[giveaway_id] = self.load_entrants(giveaway_id)
+        
+        # Active giveaways ordered by end time, so the checker sleeps until the next one is due
+        self.schedule = GiveawaySchedule()
+        for giveaway_id, giveaway in self.giveaways.items():
+            if giveaway['active']:
+                self.schedule.add(giveaway_id, giveaway['end_time'])
+        
+        # Due giveaways end concurrently, up to a cap, but one at a time per channel
+        self.end_slots = asyncio.Semaphore(self.bot.config.get('giveaway_end_concurrency', 5))
+        self.ending = {}  # giveaway ID -> task ending it
+        self.channel_tails = {}  # channel ID -> last ending task queued in that channel
+        
+        # Start giveaway checker and entrant flusher tasks
         self.bot.loop.create_task(self.check_giveaways())
+        self.flush_task = self.bot.loop.create_task(self.flush_entrants_loop())
+    
+    def cog_unload(self):
+        """Stop the entrant flusher and persist pending entrants"""
+        self.flush_task.cancel()
+        self.flush_entrants()
+    
+    @staticmethod
+    def serialize(giveaway):
+        """Copy of a giveaway record that JSON can store"""
+        data = giveaway.copy()
+        data['end_time'] = giveaway['end_time'].isoformat()
+        return data
     
     def load_giveaways(self):
-        """Load giveaways from JSON file"""
+        """Load active giveaways: the snapshot, then every journal event after it"""
+        giveaways = {}
+        try:
+            with open(SNAPSHOT_PATH, 'r') as f:
+                giveaways = json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            logging.error("Error reading giveaways.json")
+        
+        try:
+            with open(JOURNAL_PATH, 'r') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.error("Skipping damaged giveaway journal entry")  # e.g. a write cut short by a crash
+                        continue
+                    # Replaying is idempotent, so events already in the snapshot are harmless
+                    if event['op'] == 'create':
+                        giveaways[event['id']] = event['giveaway']
+                    elif event['op'] == 'end':
+                        giveaways.pop(event['id'], None)
+                    self.journal_length += 1
+        except FileNotFoundError:
+            pass
+        
+        # Convert timestamp strings back to datetime objects
+        for giveaway in giveaways.values():
+            giveaway['end_time'] = datetime.fromisoformat(giveaway['end_time'])
+        
+        # Snapshots from before archiving kept ended giveaways; move them out
+        ended = [giveaway_id for giveaway_id, giveaway in giveaways.items() if not giveaway['active']]
+        for giveaway_id in ended:
+            self.archive_giveaway(giveaway_id, giveaways.pop(giveaway_id))
+        if ended or self.journal_length:
+            self.compact_journal(giveaways)
+        return giveaways
+    
+    def record_event(self, op, giveaway_id):
+        """Append a create or end event to the journal, compacting it when it grows long"""
+        event = {'op': op, 'id': giveaway_id}
+        if op == 'create':
+            event['giveaway'] = self.serialize(self.giveaways[giveaway_id])
+        try:
+            with open(JOURNAL_PATH, 'a') as f:
+                f.write(json.dumps(event, separators=(',', ':')) + '\n')
+            self.journal_length += 1
+        except Exception as e:
+            logging.error(f"Error writing giveaway journal: {e}")
+        
+        if self.journal_length >= self.bot.config.get('giveaway_journal_compact_after', 200):
+            self.compact_journal(self.giveaways)
+    
+    def compact_journal(self, giveaways):
+        """Write active giveaways to a fresh snapshot and start an empty journal"""
         try:
-            with open('data/giveaways.json', 'r') as f:
+            data = {giveaway_id: self.serialize(giveaway) for giveaway_id, giveaway in giveaways.items()}
+            with open(SNAPSHOT_PATH + '.tmp', 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(SNAPSHOT_PATH + '.tmp', SNAPSHOT_PATH)
+            # A crash before truncating only means replaying events the snapshot already has
+            open(JOURNAL_PATH, 'w').close()
+            self.journal_length = 0
+        except Exception as e:
+            logging.error(f"Error compacting giveaway journal: {e}")
+    
+    def archive_giveaway(self, giveaway_id, giveaway, winner_ids=None):
+        """Append an ended giveaway to the archive, which is only read on demand"""
+        record = self.serialize(giveaway)
+        record['id'] = giveaway_id
+        record['active'] = False
+        if winner_ids is not None:
+            record['winner_ids'] = winner_ids
+        try:
+            with open(ARCHIVE_PATH, 'a') as f:
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        except Exception as e:
+            logging.error(f"Error archiving giveaway {giveaway_id}: {e}")
+    
+    def load_archived(self, giveaway_id):
+        """Find an ended giveaway in the archive, or None"""
+        found = None
+        try:
+            with open(ARCHIVE_PATH, 'r') as f:
+                for line in f:
+                    if f'"id":"{giveaway_id}"' not in line:
+                        continue  # Cheap filter before parsing
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get('id') == giveaway_id:
+                        found = record  # Keep the latest, e.g. after a reroll
+        except FileNotFoundError:
+            return None
+        if found:
+            found['end_time'] = datetime.fromisoformat(found['end_time'])
+        return found
+    
+    def entrants_path(self, giveaway_id):
+        """Path of the entrant file for a giveaway"""
+        return os.path.join(ENTRANTS_DIR, f"{giveaway_id}.json")
+    
+    def load_entrants(self, giveaway_id):
+        """Load a giveaway's persisted entrants as user ID -> entries"""
+        try:
+            with open(self.entrants_path(giveaway_id), 'r') as f:
                 data = json.load(f)
-                # Convert timestamp strings back to datetime objects
-                for giveaway_id, giveaway in data.items():
-                    giveaway['end_time'] = datetime.fromisoformat(giveaway['end_time'])
-                return data
         except FileNotFoundError:
             return {}
         except json.JSONDecodeError:
-            logging.error("Error reading giveaways.json")
+            logging.error(f"Error reading entrants for giveaway {giveaway_id}")
+            self.needs_reconcile.add(giveaway_id)
             return {}
+        if isinstance(data, list):
+            return {user_id: 1 for user_id in data}  # Saved before weighted entries
+        return {int(user_id): weight for user_id, weight in data.items()}
     
-    def save_giveaways(self):
-        """Save giveaways to JSON file"""
+    def save_entrants(self, giveaway_id, entrants=None):
+        """Save a giveaway's entrants (its tracked ones by default) as compact JSON"""
+        if entrants is None:
+            entrants = self.entrants.get(giveaway_id, {})
         try:
-            # Convert datetime objects to strings for JSON serialization
-            data = {}
-            for giveaway_id, giveaway in self.giveaways.items():
-                data[giveaway_id] = giveaway.copy()
-                data[giveaway_id]['end_time'] = giveaway['end_time'].isoformat()
+            with open(self.entrants_path(giveaway_id), 'w') as f:
+                json.dump(entrants, f, separators=(',', ':'))
+            self.entrants_dirty.discard(giveaway_id)
+        except Exception as e:
+            logging.error(f"Error saving entrants for giveaway {giveaway_id}: {e}")
+    
+    def flush_entrants(self):
+        """Write entrants of every giveaway that changed since the last flush"""
+        for giveaway_id in list(self.entrants_dirty):
+            self.save_entrants(giveaway_id)
+    
+    async def flush_entrants_loop(self):
+        """Background task to persist entrant changes in batches"""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            try:
+                await asyncio.sleep(self.bot.config.get('giveaway_entrants_flush_interval', 30))
+                self.flush_entrants()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in giveaway entrant flusher: {e}")
+    
+    def entry_weight(self, member):
+        """Entries a member gets: their best role weight or the booster weight, at least 1"""
+        role_weights = self.bot.config.get('giveaway_role_weights', {})
+        weight = 1
+        for role in getattr(member, 'roles', ()):
+            weight = max(weight, role_weights.get(str(role.id), 1))
+        if getattr(member, 'premium_since', None):
+            weight = max(weight, self.bot.config.get('giveaway_booster_weight', 1))
+        return weight
+    
+    def alias_table(self, giveaway_id, entrants=None):
+        """Alias table for a giveaway's final entrants, built once and kept for rerolls
+        
+        Without entrants the saved entrant file is used, which no longer
+        changes once the giveaway has ended.
+        """
+        table = self.alias_tables.get(giveaway_id) if entrants is None else None
+        if table is None:
+            if entrants is None:
+                entrants = self.load_entrants(giveaway_id)
+            table = self.alias_tables[giveaway_id] = AliasTable(entrants)
+            if len(self.alias_tables) > 8:
+                self.alias_tables.popitem(last=False)
+        self.alias_tables.move_to_end(giveaway_id)
+        return table
+    
+    def update_entrant(self, payload, entered):
+        """Apply one reaction event to a giveaway's entrants"""
+        giveaway_id = str(payload.message_id)
+        if str(payload.emoji) != GIVEAWAY_EMOJI or giveaway_id not in self.entrants:
+            return
+        if not self.giveaways[giveaway_id]['active'] or payload.user_id == self.bot.user.id:
+            return
+        if entered and payload.member is not None and payload.member.bot:
+            return
+        
+        # Entries are weighed when the user enters, from the roles they have then
+        weight = self.entry_weight(payload.member) if entered else None
+        if entered:
+            self.entrants[giveaway_id][payload.user_id] = weight
+        else:
+            self.entrants[giveaway_id].pop(payload.user_id, None)
+        self.entrants_dirty.add(giveaway_id)
+        if giveaway_id in self.reconciling:
+            self.reconciling[giveaway_id].append((payload.user_id, weight))
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        """Track giveaway entries as they happen"""
+        self.update_entrant(payload, True)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        """Track withdrawn giveaway entries"""
+        self.update_entrant(payload, False)
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Reconcile entrants of active giveaways after (re)connecting
+        
+        Reaction events are lost while the bot is offline or when a
+        session can't be resumed, so entrants are re-read from Discord once.
+        """
+        self.needs_reconcile.update(giveaway_id for giveaway_id, giveaway in self.giveaways.items() if giveaway['active'])
+        for giveaway_id in list(self.needs_reconcile):
+            if giveaway_id in self.needs_reconcile:
+                await self.reconcile(giveaway_id)
+    
+    def reconcile(self, giveaway_id):
+        """Start reconciling a giveaway's entrants, or join the run already in progress"""
+        task = self.reconcile_tasks.get(giveaway_id)
+        if task is None:
+            task = self.reconcile_tasks[giveaway_id] = asyncio.create_task(self.reconcile_entrants(giveaway_id))
+            task.add_done_callback(lambda _: self.reconcile_tasks.pop(giveaway_id, None))
+        return task
+    
+    async def reconcile_entrants(self, giveaway_id):
+        """Rebuild a giveaway's entrants from its reactions, keeping events that arrive meanwhile"""
+        self.needs_reconcile.discard(giveaway_id)
+        giveaway = self.giveaways.get(giveaway_id)
+        if not giveaway or not giveaway['active'] or giveaway_id not in self.entrants:
+            return  # Entries already closed for the draw
+        
+        channel = self.bot.get_channel(giveaway['channel_id'])
+        if not channel:
+            return
+        
+        self.reconciling[giveaway_id] = []
+        try:
+            message = await channel.fetch_message(giveaway['message_id'])
+            entrants = {}
+            for reaction in message.reactions:
+                if str(reaction.emoji) == GIVEAWAY_EMOJI:
+                    async for user in reaction.users(limit=None):
+                        if not user.bot:
+                            entrants[user.id] = self.entry_weight(channel.guild.get_member(user.id) or user)
             
-            with open('data/giveaways.json', 'w') as f:
-                json.dump(data, f, indent=2)
+            # Replay events that raced with the pagination
+            for user_id, weight in self.reconciling[giveaway_id]:
+                if weight is not None:
+                    entrants[user_id] = weight
+                else:
+                    entrants.pop(user_id, None)
+            if giveaway_id in self.entrants:
+                self.entrants[giveaway_id] = entrants
+                self.entrants_dirty.add(giveaway_id)
         except Exception as e:
-            logging.error(f"Error saving giveaways: {e}")
+            logging.error(f"Error reconciling entrants for giveaway {giveaway_id}: {e}")
+        finally:
+            del self.reconciling[giveaway_id]
     
     @commands.command(name='giveaway', aliases=['gcreate'])
     @commands.has_permissions(manage_guild=True)
@@ -88,12 +460,20 @@ class Giveaways(commands.Cog):
             color=0xff6b9d
         )
         embed.add_field(name="How to Enter", value="React with 🎉 to enter!", inline=False)
+        bonus = [
+            f"{role.mention}: {self.bot.config['giveaway_role_weights'][str(role.id)]} entries"
+            for role in ctx.guild.roles if self.bot.config.get('giveaway_role_weights', {}).get(str(role.id), 1) > 1
+        ]
+        if self.bot.config.get('giveaway_booster_weight', 1) > 1:
+            bonus.append(f"Server boosters: {self.bot.config['giveaway_booster_weight']} entries")
+        if bonus:
+            embed.add_field(name="Bonus Entries", value="\n".join(bonus[:10]), inline=False)
         embed.set_footer(text=f"Ends at")
         embed.timestamp = end_time
         
         # Send giveaway message
         giveaway_msg = await ctx.send(embed=embed)
-        await giveaway_msg.add_reaction("🎉")
+        await giveaway_msg.add_reaction(GIVEAWAY_EMOJI)
         
         # Store giveaway data
         giveaway_id = str(giveaway_msg.id)
@@ -105,11 +485,12 @@ class Giveaways(commands.Cog):
             'prize': prize,
             'winners': winners,
             'end_time': end_time,
-            'active': True,
-            'participants': []
+            'active': True
         }
+        self.entrants[giveaway_id] = {}
         
-        self.save_giveaways()
+        self.record_event('create', giveaway_id)
+        self.schedule.add(giveaway_id, end_time)
         logging.info(f"Giveaway created in {ctx.guild.name} by {ctx.author}")
     
     def parse_duration(self, duration_str):
@@ -134,6 +515,15 @@ class Giveaways(commands.Cog):
         """Manually end a giveaway"""
         giveaway_id = str(message_id)
         
+        if giveaway_id not in self.giveaways and self.load_archived(giveaway_id):
+            embed = discord.Embed(
+                title="❌ Giveaway Already Ended",
+                description="This giveaway has already ended.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
         if giveaway_id not in self.giveaways:
             embed = discord.Embed(
                 title="❌ Giveaway Not Found",
@@ -154,7 +544,8 @@ class Giveaways(commands.Cog):
             return
         
         # End the giveaway
-        await self.end_giveaway_process(giveaway_id)
+        self.schedule.remove(giveaway_id)
+        await self.start_ending(giveaway_id)
         
         embed = discord.Embed(
             title="✅ Giveaway Ended",
@@ -166,90 +557,201 @@ class Giveaways(commands.Cog):
     async def end_giveaway_process(self, giveaway_id):
         """Process ending a giveaway"""
         giveaway = self.giveaways[giveaway_id]
+        participants = None
         
         try:
-            # Get the giveaway message
             channel = self.bot.get_channel(giveaway['channel_id'])
             if not channel:
-                return
+                # Not cached; a channel that was deleted or can no longer be seen won't come back,
+                # so the giveaway is ended without an announcement instead of being retried
+                try:
+                    channel = await self.bot.fetch_channel(giveaway['channel_id'])
+                except (discord.NotFound, discord.Forbidden):
+                    logging.warning(f"Channel of giveaway {giveaway_id} is gone; ending it without an announcement")
             
-            message = await channel.fetch_message(giveaway['message_id'])
-            if not message:
-                return
+            # Entrants are tracked from reaction events; only re-read them if we may have missed some
+            if channel and (giveaway_id in self.needs_reconcile or giveaway_id in self.reconcile_tasks):
+                await self.reconcile(giveaway_id)
             
-            # Get participants from reactions
-            participants = []
-            for reaction in message.reactions:
-                if str(reaction.emoji) == "🎉":
-                    async for user in reaction.users():
-                        if not user.bot:
-                            participants.append(user)
+            # Close entries before anything else is awaited, so reaction events can't change
+            # the entrants between the draw, the participant count and the saved file
+            participants = self.entrants.pop(giveaway_id, {})
+            self.save_entrants(giveaway_id, participants)
             
-            # Select winners
+            # Select winners, weighted by entries
             winners = []
             if participants:
-                num_winners = min(giveaway['winners'], len(participants))
-                winners = random.sample(participants, num_winners)
+                winners = self.alias_table(giveaway_id, participants).sample(giveaway['winners'])
             
             # Update giveaway embed
             if winners:
-                winner_mentions = ", ".join([winner.mention for winner in winners])
+                winner_mentions = ", ".join(f"<@{user_id}>" for user_id in winners)
                 embed = discord.Embed(
                     title="🎉 GIVEAWAY ENDED! 🎉",
                     description=f"**Prize:** {giveaway['prize']}\n**Winners:** {winner_mentions}\n**Participants:** {len(participants)}",
                     color=0x00ff00
                 )
-                embed.set_footer(text="Giveaway ended")
-                embed.timestamp = datetime.now()
-                
-                # Announce winners
                 announcement = f"🎉 **Congratulations {winner_mentions}!** 🎉\nYou won **{giveaway['prize']}**!"
-                await channel.send(announcement)
             else:
                 embed = discord.Embed(
                     title="🎉 GIVEAWAY ENDED! 🎉",
                     description=f"**Prize:** {giveaway['prize']}\n**Winners:** No valid participants\n**Participants:** 0",
                     color=0xff0000
                 )
-                embed.set_footer(text="Giveaway ended")
-                embed.timestamp = datetime.now()
-                
-                await channel.send("🎉 Giveaway ended, but no one participated! 😢")
+                announcement = "🎉 Giveaway ended, but no one participated! 😢"
+            embed.set_footer(text="Giveaway ended")
+            embed.timestamp = datetime.now()
             
-            await message.edit(embed=embed)
+            # Edit through a partial message so nothing has to be fetched; a deleted
+            # giveaway message fails here, before anything is announced
+            if channel:
+                try:
+                    await channel.get_partial_message(giveaway['message_id']).edit(embed=embed)
+                except discord.NotFound:
+                    logging.warning(f"Giveaway message {giveaway_id} was deleted; ending it without an announcement")
+                else:
+                    await channel.send(announcement)
             
-            # Mark giveaway as ended
+            # Mark giveaway as ended and move it to the archive; its entrant file stays for rerolls
             giveaway['active'] = False
-            self.save_giveaways()
+            self.archive_giveaway(giveaway_id, giveaway, winners)
+            del self.giveaways[giveaway_id]
+            self.record_event('end', giveaway_id)
             
-            logging.info(f"Giveaway ended in {channel.guild.name}, {len(winners)} winners selected")
+            ended_at = datetime.now()
+            lateness = (ended_at - giveaway['end_time']).total_seconds()
+            logging.info(
+                f"Giveaway {giveaway_id} ended in {channel.guild.name if channel else giveaway['guild_id']}, {len(winners)} winners selected "
+                f"scheduled={giveaway['end_time'].isoformat(timespec='seconds')} actual={ended_at.isoformat(timespec='seconds')} "
+                f"latency={lateness:.2f}s",
+                extra={'giveaway_end': {'id': giveaway_id, 'scheduled': giveaway['end_time'].isoformat(), 'actual': ended_at.isoformat(), 'latency': lateness}}
+            )
             
         except Exception as e:
             logging.error(f"Error ending giveaway {giveaway_id}: {e}")
+            if giveaway['active'] and participants is not None:
+                # Reopen entries for the retry; reactions missed while they were closed are re-read
+                self.entrants[giveaway_id] = participants
+                self.needs_reconcile.add(giveaway_id)
+                self.alias_tables.pop(giveaway_id, None)
     
     async def check_giveaways(self):
-        """Background task to check for ended giveaways"""
+        """Background task that ends giveaways as their deadlines arrive"""
         await self.bot.wait_until_ready()
         
         while not self.bot.is_closed():
             try:
-                current_time = datetime.now()
-                ended_giveaways = []
-                
-                for giveaway_id, giveaway in self.giveaways.items():
-                    if giveaway['active'] and current_time >= giveaway['end_time']:
-                        ended_giveaways.append(giveaway_id)
+                # Sleep until the next deadline, or until create/gend changes the schedule
+                self.schedule.wake.clear()
+                next_due = self.schedule.peek()
+                if next_due is None:
+                    await self.schedule.wake.wait()
+                    continue
                 
-                for giveaway_id in ended_giveaways:
-                    await self.end_giveaway_process(giveaway_id)
+                delay = next_due[0] - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self.schedule.wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
                 
-                # Check every 30 seconds
-                await asyncio.sleep(30)
+                # Hand every due giveaway off without waiting, so one slow end can't delay the rest
+                while next_due is not None and next_due[0] <= time.time():
+                    giveaway_id = self.schedule.pop()
+                    giveaway = self.giveaways.get(giveaway_id)
+                    if giveaway and giveaway['active']:
+                        self.start_ending(giveaway_id)
+                    next_due = self.schedule.peek()
                 
             except Exception as e:
                 logging.error(f"Error in giveaway checker: {e}")
                 await asyncio.sleep(60)  # Wait longer on error
     
+    def start_ending(self, giveaway_id):
+        """Start ending a giveaway, or return the task already ending it"""
+        task = self.ending.get(giveaway_id)
+        if task is None:
+            channel_id = self.giveaways[giveaway_id]['channel_id']
+            previous = self.channel_tails.get(channel_id)
+            task = asyncio.create_task(self.end_in_order(giveaway_id, previous))
+            self.ending[giveaway_id] = task
+            self.channel_tails[channel_id] = task
+            
+            def finished(_):
+                self.ending.pop(giveaway_id, None)
+                if self.channel_tails.get(channel_id) is task:
+                    del self.channel_tails[channel_id]
+            task.add_done_callback(finished)
+        return task
+    
+    async def end_in_order(self, giveaway_id, previous):
+        """End a giveaway after earlier ones in its channel, within the concurrency cap"""
+        if previous is not None:
+            await asyncio.wait([previous])  # Only ordering matters; its errors are its own
+        
+        giveaway = self.giveaways.get(giveaway_id)
+        if not giveaway or not giveaway['active']:
+            return
+        async with self.end_slots:
+            await self.end_giveaway_process(giveaway_id)
+        
+        if giveaway['active']:
+            # Ending failed (e.g. Discord was unreachable); try again in a minute
+            self.schedule.add(giveaway_id, datetime.now() + timedelta(seconds=60))
+    
+    @commands.command(name='greroll')
+    @commands.has_permissions(manage_guild=True)
+    async def reroll_giveaway(self, ctx, message_id: int, winners: int = 1):
+        """Draw new winners for an ended giveaway"""
+        giveaway_id = str(message_id)
+        
+        if giveaway_id in self.giveaways:
+            embed = discord.Embed(
+                title="❌ Giveaway Still Active",
+                description="This giveaway hasn't ended yet. Use `!gend` to end it first.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        giveaway = self.load_archived(giveaway_id)
+        if not giveaway or giveaway['guild_id'] != ctx.guild.id:
+            embed = discord.Embed(
+                title="❌ Giveaway Not Found",
+                description="No ended giveaway found with that message ID.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        if winners < 1 or winners > 20:
+            embed = discord.Embed(
+                title="❌ Invalid Winner Count",
+                description="Number of winners must be between 1 and 20.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        # Everyone who already won is excluded from the new draw
+        previous = giveaway.get('winner_ids', [])
+        new_winners = self.alias_table(giveaway_id).sample(winners, exclude=previous)
+        if not new_winners:
+            embed = discord.Embed(
+                title="❌ No Entrants Left",
+                description="Everyone who entered this giveaway has already won.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        winner_mentions = ", ".join(f"<@{user_id}>" for user_id in new_winners)
+        await ctx.send(f"🎉 **New winner{'s' if len(new_winners) > 1 else ''}: {winner_mentions}!** 🎉\nYou won **{giveaway['prize']}**!")
+        
+        self.archive_giveaway(giveaway_id, giveaway, previous + new_winners)
+        logging.info(f"Giveaway {giveaway_id} rerolled in {ctx.guild.name} by {ctx.author}, {len(new_winners)} new winners")
+    
     @commands.command(name='glist')
     async def list_giveaways(self, ctx):
         """List active giveaways"""
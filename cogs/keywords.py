@@ -1,17 +1,776 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import asyncio
+import bisect
+import csv
+import fnmatch
+import functools
+import io
 import json
+import os
+import random
 import re
+import time
+from datetime import datetime
 import logging
 
+try:
+    import regex
+except ImportError:
+    regex = None  # re: patterns need the regex module's match timeouts and are refused without it
+
+KEYWORD_SHARD_DIR = 'data/keywords'
+KEYWORD_STATS_DIR = 'data/keyword_stats'
+SHARD_SWEEP_INTERVAL = 60  # seconds between idle shard sweeps
+MAX_IMPORT_SIZE = 2 * 1024 * 1024  # bytes accepted by !keywordimport
+MAX_RESPONSE_LENGTH = 2000  # Discord message limit
+WORD_PATTERN = re.compile(r'\w+')
+PATTERN_PREFIXES = ('re:', 'glob:')
+MAX_PATTERN_LENGTH = 200
+MAX_PATTERN_INPUT = 256  # longer messages are only checked against literal keywords
+PATTERN_PROBE_BUDGET = 0.02  # seconds the validation probes may take in total
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*(?:[+*]|\{\d*,\d*\})(?:[^()\\]|\\.)*\)(?:[+*]|\{\d*,\d*\})')
+REPEAT = re.compile(r'[+*]|\{\d*,')
+GROUP_PREFIX = re.compile(r'\A\?(?::|>|P<\w+>)')
+KEYWORDS_PER_PAGE = 10
+PAGE_CHAR_LIMIT = 3500  # stay well under the 4096 character embed description limit
+
+def _is_word_char(char):
+    """Mirror the regex definition of a word character used by \\b"""
+    return char.isalnum() or char == '_'
+
+def _first_char(branch):
+    """The character a regex branch must start with, or None if it could start with several"""
+    if not branch or branch[0] in '.[()^$?|':
+        return None
+    if branch[0] == '\\':
+        # Escapes like \w or \d stand for many characters; \. and friends for one
+        if len(branch) < 2 or branch[1].isalnum():
+            return None
+        char, rest = branch[1], branch[2:]
+    else:
+        char, rest = branch[0], branch[1:]
+    if rest[:1] in ('*', '?') or rest.startswith('{0'):
+        return None  # The first character is optional
+    return char.lower()
+
+def _overlapping_alternation(body):
+    """Whether a repeated group has alternatives that can start alike, like (a|aa)*
+    
+    Such groups can split the same text many ways and backtrack exponentially.
+    """
+    groups = []  # (index of the opening parenthesis, indexes of its top-level |)
+    in_class = False
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == '\\':
+            i += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            i += 1 + body.startswith('^', i + 1)
+            continue  # A ] right after [ or [^ is a literal
+        elif char == '(':
+            groups.append((i, []))
+        elif char == '|' and groups:
+            groups[-1][1].append(i)
+        elif char == ')' and groups:
+            start, bars = groups.pop()
+            if bars and REPEAT.match(body, i + 1):
+                edges = [start] + bars + [i]
+                branches = [body[a + 1:b] for a, b in zip(edges, edges[1:])]
+                branches[0] = GROUP_PREFIX.sub('', branches[0])
+                firsts = [_first_char(branch) for branch in branches]
+                if None in firsts or len(set(firsts)) < len(firsts):
+                    return True
+        i += 1
+    return False
+
+def search_pattern(compiled, text, timeout):
+    """Search with a pattern keyword, raising TimeoutError once timeout (seconds) is spent
+    
+    Without the regex module only glob: patterns exist, and the atomic
+    groups fnmatch compiles them to cannot backtrack catastrophically.
+    """
+    if regex is not None:
+        return compiled.search(text, timeout=timeout)
+    return compiled.search(text)
+
+def is_pattern_keyword(keyword):
+    """Whether a keyword is a re: or glob: pattern rather than a literal phrase"""
+    return keyword.startswith(PATTERN_PREFIXES)
+
+def normalize_keyword(keyword):
+    """Lowercase a literal keyword; pattern keywords keep their body as written"""
+    keyword = keyword.strip()
+    for prefix in PATTERN_PREFIXES:
+        if keyword.lower().startswith(prefix):
+            return prefix + keyword[len(prefix):]
+    return keyword.lower()
+
+@functools.lru_cache(maxsize=4096)
+def compile_pattern_keyword(keyword):
+    """Validate and compile a pattern keyword once, raising ValueError if it is unsafe
+    
+    re: patterns are searched anywhere in the message, glob: patterns must
+    match the whole message. Both ignore case, and both run on the regex
+    module when it is installed so every search can be cut off.
+    """
+    prefix, body = keyword.split(':', 1)
+    if not body:
+        raise ValueError("Pattern is empty")
+    if len(body) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"Patterns must be {MAX_PATTERN_LENGTH} characters or less")
+    
+    if prefix == 'glob':
+        source = r'\A' + fnmatch.translate(body)
+    else:
+        if BACKREFERENCE.search(body):
+            raise ValueError("Backreferences are not allowed")
+        if NESTED_QUANTIFIER.search(body):
+            raise ValueError("Nested quantifiers such as `(a+)+` are not allowed")
+        if _overlapping_alternation(body):
+            raise ValueError("Repeated alternatives that can match the same text, such as `(a|aa)*`, are not allowed")
+        if regex is None:
+            raise ValueError("Regex patterns need the `regex` package installed")
+        source = body
+    
+    engine = regex if regex is not None else re
+    try:
+        compiled = engine.compile(source, engine.IGNORECASE)
+    except engine.error as e:
+        raise ValueError(f"Invalid pattern: {e}")
+    
+    # Probe with growing inputs that tend to trigger backtracking, stopping once over budget
+    start = time.perf_counter()
+    for length in (8, 12, 16, 20):
+        for probe in ('a' * length + '!', ' ' * length + '!', 'ab' * (length // 2) + '!', '1' * length + 'x'):
+            remaining = PATTERN_PROBE_BUDGET - (time.perf_counter() - start)
+            try:
+                if remaining <= 0:
+                    raise TimeoutError
+                search_pattern(compiled, probe, remaining)
+            except TimeoutError:
+                raise ValueError("Pattern is too slow on test input (possible catastrophic backtracking)")
+    return compiled
+
+def _trie_pattern(node):
+    """Render a character trie as a regex alternation that branches one character at a time"""
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+    group = '(?:' + '|'.join(alternatives) + ')'
+    return group + '?' if '' in node else group
+
+class KeywordPrefilter:
+    """Cheap test that every message containing one of the keywords passes
+    
+    Because keywords only match on word boundaries, each run of word
+    characters in a keyword shows up in a matching message as a whole
+    token. One run per keyword is indexed: the one shared by the fewest
+    keywords (so "good morning" and "good night" index "morning" and
+    "night"), longest first on ties. Small indexes are searched with a
+    trie-shaped regex, large ones by token set lookup. Keywords without
+    word characters are searched literally.
+    """
+    REGEX_LIMIT = 500  # indexed tokens before set lookup beats the regex
+    
+    def __init__(self, keywords):
+        keyword_runs = [(keyword, set(WORD_PATTERN.findall(keyword))) for keyword in keywords]
+        run_counts = {}
+        for keyword, runs in keyword_runs:
+            for run in runs:
+                run_counts[run] = run_counts.get(run, 0) + 1
+        
+        self.tokens = set()
+        literals = set()
+        for keyword, runs in keyword_runs:
+            if runs:
+                self.tokens.add(min(runs, key=lambda run: (run_counts[run], -len(run), run)))
+            elif keyword:
+                literals.add(re.escape(keyword))
+        
+        alternatives = sorted(literals)
+        if self.tokens and len(self.tokens) <= self.REGEX_LIMIT:
+            trie = {}
+            for token in self.tokens:
+                node = trie
+                for char in token:
+                    node = node.setdefault(char, {})
+                node[''] = {}
+            # No leading \b: a bare alternation lets the regex engine skip ahead by first character
+            alternatives.insert(0, '(?:' + _trie_pattern(trie) + r')\b')
+            self.tokens = None
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+    
+    def might_match(self, text):
+        """False only if no keyword can occur in the (lowercased) text"""
+        if self.tokens and not self.tokens.isdisjoint(WORD_PATTERN.findall(text)):
+            return True
+        return self.pattern is not None and self.pattern.search(text) is not None
+
+def parse_keyword_import(filename, data):
+    """Parse an uploaded JSON or CSV keyword file into (keywords, errors)"""
+    errors = []
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return {}, ["File is not valid UTF-8"]
+    
+    # Normalise both formats into (keyword, response) pairs
+    pairs = []
+    if filename.lower().endswith('.csv'):
+        for line_number, row in enumerate(csv.reader(io.StringIO(text)), 1):
+            if not row:
+                continue
+            if line_number == 1 and [cell.strip().lower() for cell in row[:2]] == ['keyword', 'response']:
+                continue  # Header row
+            if len(row) != 2:
+                errors.append(f"Line {line_number}: expected 2 columns, got {len(row)}")
+                continue
+            pairs.append((f"Line {line_number}", row[0], row[1]))
+    else:
+        try:
+            raw = json.loads(text)
+        except json.JSONDecodeError as e:
+            return {}, [f"Invalid JSON: {e}"]
+        if not isinstance(raw, dict):
+            return {}, ["JSON must be an object mapping keywords to responses"]
+        for keyword, responses in raw.items():
+            if isinstance(responses, str):
+                responses = [responses]
+            if not isinstance(responses, list):
+                errors.append(f"'{keyword}': responses must be a string or a list")
+                continue
+            for response in responses:
+                pairs.append((f"'{keyword}'", keyword, response))
+    
+    keywords = {}
+    for where, keyword, response in pairs:
+        if not isinstance(response, str) or not response.strip():
+            errors.append(f"{where}: empty or non-text response")
+            continue
+        if len(response) > MAX_RESPONSE_LENGTH:
+            errors.append(f"{where}: response longer than {MAX_RESPONSE_LENGTH} characters")
+            continue
+        keyword = normalize_keyword(keyword)
+        if not keyword:
+            errors.append(f"{where}: empty keyword")
+            continue
+        if is_pattern_keyword(keyword):
+            try:
+                compile_pattern_keyword(keyword)
+            except ValueError as e:
+                errors.append(f"{where}: {e}")
+                continue
+        responses = keywords.setdefault(keyword, [])
+        if response not in responses:
+            responses.append(response)
+    
+    return keywords, errors
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that scans a message once for every keyword"""
+    def __init__(self, keywords):
+        self.keywords = [keyword for keyword in keywords if keyword]
+        self.min_length = min(map(len, self.keywords), default=0)
+        self.prefilter = KeywordPrefilter(self.keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        # Build the trie; outputs store (table index, keyword length)
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((index, len(keyword)))
+        
+        # Breadth-first pass to fill in failure links and merged outputs
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    def find(self, text):
+        """Return the first keyword (in table order) found on word boundaries, or None"""
+        # Cheap rejection before walking the automaton
+        if len(text) < self.min_length or not self.prefilter.might_match(text):
+            return None
+        
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        best = None
+        state = 0
+        
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            
+            for index, length in output[state]:
+                if best is not None and index >= best:
+                    continue
+                start = position - length + 1
+                if _is_word_char(text[start]) == (start > 0 and _is_word_char(text[start - 1])):
+                    continue
+                end = position + 1
+                if _is_word_char(text[position]) == (end < len(text) and _is_word_char(text[end])):
+                    continue
+                best = index
+                if best == 0:
+                    return self.keywords[0]
+        
+        return self.keywords[best] if best is not None else None
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of latencies in microseconds"""
+    BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+    
+    def record(self, micros):
+        """Add one latency sample"""
+        self.counts[bisect.bisect_left(self.BOUNDS, micros)] += 1
+        self.total += 1
+        self.sum += micros
+    
+    def percentile(self, fraction):
+        """Upper bucket bound containing the given fraction of samples"""
+        if not self.total:
+            return None
+        threshold = fraction * self.total
+        running = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            running += count
+            if running >= threshold:
+                return bound
+        return float('inf')
+    
+    def mean(self):
+        """Average latency, or None without samples"""
+        return self.sum / self.total if self.total else None
+
+class KeywordSearchIndex:
+    """Trigram index over keywords for substring and typo-tolerant search"""
+    FUZZY_THRESHOLD = 0.5  # share of the query's trigrams a fuzzy result must contain
+    
+    def __init__(self):
+        self.postings = {}  # trigram -> set of keywords containing it
+        self.grams = {}  # keyword -> its trigram set
+    
+    @staticmethod
+    def trigrams(text, padded=True):
+        """Distinct trigrams of text, padded so short words and word edges are indexed"""
+        if padded:
+            text = f"  {text} "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def add(self, keyword):
+        """Index one keyword"""
+        grams = self.trigrams(keyword)
+        self.grams[keyword] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(keyword)
+    
+    def remove(self, keyword):
+        """Drop one keyword from the index"""
+        for gram in self.grams.pop(keyword, ()):
+            posting = self.postings[gram]
+            posting.discard(keyword)
+            if not posting:
+                del self.postings[gram]
+    
+    def sync(self, keywords):
+        """Apply only the keywords added or removed since the last sync"""
+        current = self.grams.keys()
+        for keyword in current - keywords:
+            self.remove(keyword)
+        for keyword in keywords - current:
+            self.add(keyword)
+    
+    def substring_matches(self, query):
+        """Keywords containing query, found by intersecting trigram postings"""
+        if len(query) >= 3:
+            postings = sorted((self.postings.get(gram, set()) for gram in self.trigrams(query, padded=False)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            # Too short for a full trigram: collect postings of every trigram containing it
+            candidates = set()
+            for gram, posting in self.postings.items():
+                if query in gram:
+                    candidates.update(posting)
+        return {keyword for keyword in candidates if query in keyword}
+    
+    def search(self, query, limit=10):
+        """Ranked matches as (keyword, kind, similarity): exact, prefix, substring, then fuzzy
+        
+        Similarity is the share of the query's trigrams found in the keyword,
+        so a misspelt word still finds the longer phrase that contains it.
+        Ties are broken by overall trigram overlap, then by length.
+        """
+        if not query:
+            return []
+        
+        # Count shared trigrams per candidate from the postings of the query's trigrams
+        query_grams = self.trigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for keyword in self.postings.get(gram, ()):
+                shared[keyword] = shared.get(keyword, 0) + 1
+        
+        results = []
+        substring = self.substring_matches(query)
+        for keyword in substring | shared.keys():
+            common = shared.get(keyword, 0)
+            similarity = common / len(query_grams)
+            overlap = common / (len(query_grams) + len(self.grams[keyword]) - common)
+            if keyword == query:
+                rank = 0
+                kind = "exact"
+            elif keyword in substring:
+                rank = 1 if keyword.startswith(query) else 2
+                kind = "prefix" if rank == 1 else "substring"
+            elif similarity >= self.FUZZY_THRESHOLD:
+                rank = 3
+                kind = "fuzzy"
+            else:
+                continue
+            results.append((rank, -similarity, -overlap, len(keyword), keyword, kind))
+        
+        results.sort()
+        return [(result[4], result[5], -result[1]) for result in results[:limit]]
+
+class TokenBucket:
+    """Token bucket that refills continuously at a fixed rate"""
+    __slots__ = ('tokens', 'updated')
+    
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+    
+    def refill(self, rate, capacity, now):
+        """Add the tokens earned since the last update"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+class ReplyThrottle:
+    """Per-channel and per-keyword reply budgets for keyword responses"""
+    def __init__(self):
+        self.channel_buckets = {}  # channel ID -> TokenBucket
+        self.keyword_buckets = {}  # (guild ID, keyword) -> TokenBucket
+        self.pending = {}  # channel ID -> keyword waiting for a coalesced reply
+        self.last_sweep = time.monotonic()
+    
+    def allow(self, channel_id, keyword_key, now, config):
+        """Take one token from both buckets if both have one available"""
+        channel_rate = config.get('keyword_channel_rate', 0.5)
+        channel_burst = config.get('keyword_channel_burst', 5)
+        keyword_rate = config.get('keyword_rate', 0.5)
+        keyword_burst = config.get('keyword_burst', 5)
+        
+        channel_bucket = self.channel_buckets.get(channel_id)
+        if channel_bucket is None:
+            channel_bucket = self.channel_buckets[channel_id] = TokenBucket(channel_burst, now)
+        else:
+            channel_bucket.refill(channel_rate, channel_burst, now)
+        
+        keyword_bucket = self.keyword_buckets.get(keyword_key)
+        if keyword_bucket is None:
+            keyword_bucket = self.keyword_buckets[keyword_key] = TokenBucket(keyword_burst, now)
+        else:
+            keyword_bucket.refill(keyword_rate, keyword_burst, now)
+        
+        if channel_bucket.tokens < 1 or keyword_bucket.tokens < 1:
+            return False
+        channel_bucket.tokens -= 1
+        keyword_bucket.tokens -= 1
+        return True
+    
+    def retry_after(self, channel_id, keyword_key, config):
+        """Seconds until both buckets will have a token again"""
+        waits = [0.0]
+        channel_bucket = self.channel_buckets.get(channel_id)
+        if channel_bucket is not None and channel_bucket.tokens < 1:
+            waits.append((1 - channel_bucket.tokens) / config.get('keyword_channel_rate', 0.5))
+        keyword_bucket = self.keyword_buckets.get(keyword_key)
+        if keyword_bucket is not None and keyword_bucket.tokens < 1:
+            waits.append((1 - keyword_bucket.tokens) / config.get('keyword_rate', 0.5))
+        return max(waits)
+    
+    def sweep(self, now, config):
+        """Evict buckets that have refilled completely, since they hold no state"""
+        self.last_sweep = now
+        channel_full = config.get('keyword_channel_burst', 5) / config.get('keyword_channel_rate', 0.5)
+        keyword_full = config.get('keyword_burst', 5) / config.get('keyword_rate', 0.5)
+        for buckets, full_after in ((self.channel_buckets, channel_full), (self.keyword_buckets, keyword_full)):
+            idle = [key for key, bucket in buckets.items() if now - bucket.updated >= full_after]
+            for key in idle:
+                del buckets[key]
+
+class KeywordShard:
+    """One guild's keyword table together with its compiled matcher and counters"""
+    def __init__(self, guild_id, keywords, stats):
+        self.guild_id = guild_id
+        self.keywords = keywords
+        self.last_used = time.monotonic()
+        
+        # Counters are kept in memory and flushed to disk in batches
+        self.hits = stats.get('hits', {})
+        self.messages_scanned = stats.get('messages_scanned', 0)
+        self.triggers = stats.get('triggers', 0)
+        self.throttled = stats.get('throttled', 0)
+        self.disabled_patterns = set(stats.get('disabled_patterns', []))
+        self.pattern_strikes = {}
+        self.stats_since = stats.get('since', time.time())
+        self.stats_dirty = False
+        self.latency = LatencyHistogram()
+        self.pages = None  # Rendered !keywords pages, cleared on every table change
+        self.search_index = None  # Built on the first search, then kept in sync
+        self.rebuild()
+    
+    def rebuild(self):
+        """Recompile the keyword matcher after the keyword table changes"""
+        literals = []
+        self.patterns = []  # (table index, keyword, compiled pattern)
+        for index, keyword in enumerate(self.keywords):
+            if not is_pattern_keyword(keyword):
+                literals.append(keyword)
+            elif keyword not in self.disabled_patterns:
+                try:
+                    self.patterns.append((index, keyword, compile_pattern_keyword(keyword)))
+                except ValueError as e:
+                    logging.warning(f"Skipping pattern keyword '{keyword}' in guild {self.guild_id}: {e}")
+        
+        self.matcher = KeywordMatcher(literals)
+        self.order = {keyword: index for index, keyword in enumerate(self.keywords)} if self.patterns else {}
+        self.pages = None
+        if self.search_index is not None:
+            self.search_index.sync(self.keywords.keys())
+        
+        # Forget hit counts and pattern state of keywords that no longer exist
+        stale = [keyword for keyword in self.hits if keyword not in self.keywords]
+        for keyword in stale:
+            del self.hits[keyword]
+        removed_patterns = {keyword for keyword in self.disabled_patterns if keyword not in self.keywords}
+        self.disabled_patterns -= removed_patterns
+        for keyword in list(self.pattern_strikes):
+            if keyword not in self.keywords:
+                del self.pattern_strikes[keyword]
+        if stale or removed_patterns:
+            self.stats_dirty = True
+    
+    def match(self, text, budget, max_strikes):
+        """First keyword in table order found in text, literal or pattern
+        
+        Patterns share a time budget (seconds) per message; each search is cut
+        off when the budget runs out and the remaining patterns are skipped. A
+        pattern that runs into the budget with at least half of it left gets a
+        strike and is disabled after max_strikes. Messages over
+        MAX_PATTERN_INPUT characters skip patterns altogether, since a glob or
+        anchored regex can't be checked against part of a message.
+        """
+        keyword = self.matcher.find(text)
+        if not self.patterns or len(text) > MAX_PATTERN_INPUT:
+            return keyword
+        
+        # Only patterns earlier in the table than the literal match can win
+        limit = self.order[keyword] if keyword is not None else len(self.keywords)
+        spent = 0.0
+        for index, pattern_keyword, compiled in self.patterns:
+            remaining = budget - spent
+            if index >= limit or remaining <= 0:
+                break
+            start = time.perf_counter()
+            timed_out = False
+            try:
+                found = search_pattern(compiled, text, remaining)
+            except TimeoutError:
+                found, timed_out = None, True
+            elapsed = time.perf_counter() - start
+            spent += elapsed
+            if (timed_out or elapsed > remaining) and remaining >= budget / 2:
+                self.strike_pattern(pattern_keyword, elapsed, max_strikes)
+            if found:
+                return pattern_keyword
+        return keyword
+    
+    def strike_pattern(self, keyword, elapsed, max_strikes):
+        """Record a budget overrun and disable the pattern after too many"""
+        strikes = self.pattern_strikes.get(keyword, 0) + 1
+        self.pattern_strikes[keyword] = strikes
+        logging.warning(f"Pattern keyword '{keyword}' in guild {self.guild_id} took {elapsed * 1000:.1f}ms (strike {strikes}/{max_strikes})")
+        if strikes >= max_strikes:
+            self.disabled_patterns.add(keyword)
+            self.patterns = [pattern for pattern in self.patterns if pattern[1] != keyword]
+            self.stats_dirty = True
+            logging.warning(f"Disabled pattern keyword '{keyword}' in guild {self.guild_id}")
+    
+    def enable_pattern(self, keyword):
+        """Re-enable a pattern that was disabled for being too slow"""
+        self.disabled_patterns.discard(keyword)
+        self.pattern_strikes.pop(keyword, None)
+        self.stats_dirty = True
+        self.rebuild()
+    
+    def record_scan(self, keyword, micros):
+        """Count one scanned message and its match latency"""
+        self.messages_scanned += 1
+        self.latency.record(micros)
+        if keyword is not None:
+            self.triggers += 1
+            self.hits[keyword] = self.hits.get(keyword, 0) + 1
+        self.stats_dirty = True
+    
+    def stats_data(self):
+        """Counters in their on-disk form"""
+        return {
+            'hits': self.hits,
+            'messages_scanned': self.messages_scanned,
+            'triggers': self.triggers,
+            'throttled': self.throttled,
+            'disabled_patterns': sorted(self.disabled_patterns),
+            'since': self.stats_since
+        }
+    
+    def search(self, query, limit=10):
+        """Ranked keyword search through the trigram index"""
+        if self.search_index is None:
+            self.search_index = KeywordSearchIndex()
+            self.search_index.sync(self.keywords.keys())
+        return self.search_index.search(query, limit)
+    
+    def render_pages(self):
+        """Render the keyword listing into embed-sized pages, reusing the cached copy"""
+        if self.pages is not None:
+            return self.pages
+        
+        pages = []
+        entries = []
+        length = 0
+        for keyword, responses in self.keywords.items():
+            responses_text = '\n'.join([f"  {j}. {resp[:50]}{'...' if len(resp) > 50 else ''}"
+                                        for j, resp in enumerate(responses[:5], 1)])
+            if len(responses) > 5:
+                responses_text += f"\n  ... and {len(responses) - 5} more"
+            entry = f"**{keyword[:100]}**\n{responses_text}"
+            
+            if entries and (len(entries) >= KEYWORDS_PER_PAGE or length + len(entry) > PAGE_CHAR_LIMIT):
+                pages.append('\n\n'.join(entries))
+                entries = []
+                length = 0
+            entries.append(entry)
+            length += len(entry) + 2
+        if entries:
+            pages.append('\n\n'.join(entries))
+        
+        self.pages = pages
+        return pages
+
+class KeywordPageView(discord.ui.View):
+    """Previous/next buttons over a shard's cached keyword pages"""
+    def __init__(self, shard, author_id):
+        super().__init__(timeout=180)
+        self.shard = shard
+        self.author_id = author_id
+        self.page = 0
+        self.message = None
+        self.update_buttons()
+    
+    def build_embed(self):
+        """Embed for the current page"""
+        pages = self.shard.render_pages()
+        self.page = min(self.page, max(len(pages) - 1, 0))
+        embed = discord.Embed(
+            title="📋 Keywords & Responses",
+            description=pages[self.page] if pages else "No keywords configured.",
+            color=0x0099ff
+        )
+        embed.set_footer(text=f"Page {self.page + 1}/{max(len(pages), 1)} • {len(self.shard.keywords)} keywords")
+        return embed
+    
+    def update_buttons(self):
+        """Enable only the directions that have pages"""
+        page_count = len(self.shard.render_pages())
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= page_count - 1
+    
+    async def interaction_check(self, interaction: discord.Interaction):
+        """Only the member who ran the command can turn pages"""
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Run `!keywords` yourself to browse the list.", ephemeral=True)
+            return False
+        return True
+    
+    async def show_page(self, interaction, page):
+        """Switch to a page and redraw the message"""
+        self.page = page
+        embed = self.build_embed()
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+    
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+    
+    async def on_timeout(self):
+        """Remove the buttons once the view expires"""
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
 class Keywords(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.keywords = self.load_keywords()
+        self.default_keywords = self.load_keywords()  # Seed table for guilds without a shard
+        self.shards = {}  # Loaded keyword shards, keyed by guild ID
+        self.throttle = ReplyThrottle()
+        self.reply_tasks = set()  # Pending coalesced replies, referenced so they are not collected mid-sleep
+        self.last_sweep = time.monotonic()
+        os.makedirs(KEYWORD_SHARD_DIR, exist_ok=True)
+        os.makedirs(KEYWORD_STATS_DIR, exist_ok=True)
+        
+        # Start keyword stats flusher task
+        self.stats_task = self.bot.loop.create_task(self.flush_stats_loop())
+    
+    def cog_unload(self):
+        """Stop the stats flusher and persist pending counters"""
+        self.stats_task.cancel()
+        for task in self.reply_tasks:
+            task.cancel()
+        self.flush_stats()
     
     def load_keywords(self):
-        """Load keywords and responses from JSON file"""
+        """Load the default keywords and responses from JSON file"""
         try:
             with open('data/keywords.json', 'r') as f:
                 return json.load(f)
@@ -33,25 +792,130 @@ class Keywords(commands.Cog):
             logging.error("Error reading keywords.json")
             return {}
     
-    def save_keywords(self, keywords=None):
-        """Save keywords to JSON file"""
+    def save_keywords(self, keywords):
+        """Save the default keywords to JSON file"""
         try:
-            if keywords is None:
-                keywords = self.keywords
             with open('data/keywords.json', 'w') as f:
                 json.dump(keywords, f, indent=2)
         except Exception as e:
             logging.error(f"Error saving keywords: {e}")
     
+    def shard_path(self, guild_id):
+        """Path of the keyword shard file for a guild"""
+        return os.path.join(KEYWORD_SHARD_DIR, f"{guild_id}.json")
+    
+    def load_shard(self, guild_id):
+        """Load a guild's keywords, seeding from the defaults if it has no shard yet"""
+        try:
+            with open(self.shard_path(guild_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {keyword: list(responses) for keyword, responses in self.default_keywords.items()}
+        except json.JSONDecodeError:
+            logging.error(f"Error reading keyword shard for guild {guild_id}")
+            return {}
+    
+    def save_shard(self, shard):
+        """Save a guild's keywords to its shard file"""
+        shard.pages = None  # Every table change is saved through here
+        try:
+            with open(self.shard_path(shard.guild_id), 'w') as f:
+                json.dump(shard.keywords, f, indent=2)
+        except Exception as e:
+            logging.error(f"Error saving keywords for guild {shard.guild_id}: {e}")
+    
+    def stats_path(self, guild_id):
+        """Path of the keyword stats file for a guild"""
+        return os.path.join(KEYWORD_STATS_DIR, f"{guild_id}.json")
+    
+    def load_stats(self, guild_id):
+        """Load a guild's persisted keyword counters"""
+        try:
+            with open(self.stats_path(guild_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logging.error(f"Error reading keyword stats for guild {guild_id}")
+            return {}
+    
+    def save_stats(self, shard):
+        """Save a guild's keyword counters to its stats file"""
+        try:
+            with open(self.stats_path(shard.guild_id), 'w') as f:
+                json.dump(shard.stats_data(), f)
+            shard.stats_dirty = False
+        except Exception as e:
+            logging.error(f"Error saving keyword stats for guild {shard.guild_id}: {e}")
+    
+    def flush_stats(self):
+        """Write counters of every shard that changed since the last flush"""
+        for shard in self.shards.values():
+            if shard.stats_dirty:
+                self.save_stats(shard)
+    
+    async def flush_stats_loop(self):
+        """Background task to flush keyword counters in batches"""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            try:
+                await asyncio.sleep(self.bot.config.get('keyword_stats_flush_interval', 300))
+                self.flush_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in keyword stats flusher: {e}")
+    
+    def get_shard(self, guild_id):
+        """Return a guild's keyword shard, loading it on first use"""
+        now = time.monotonic()
+        shard = self.shards.get(guild_id)
+        if shard is None:
+            shard = KeywordShard(guild_id, self.load_shard(guild_id), self.load_stats(guild_id))
+            self.shards[guild_id] = shard
+        shard.last_used = now
+        
+        if now - self.last_sweep >= SHARD_SWEEP_INTERVAL:
+            self.evict_idle_shards(now)
+        return shard
+    
+    def evict_idle_shards(self, now):
+        """Drop shards that have not been used within the idle timeout"""
+        self.last_sweep = now
+        idle_timeout = self.bot.config.get('keyword_shard_idle_timeout', 3600)
+        idle_guilds = [guild_id for guild_id, shard in self.shards.items() if now - shard.last_used > idle_timeout]
+        for guild_id in idle_guilds:
+            shard = self.shards.pop(guild_id)
+            if shard.stats_dirty:
+                self.save_stats(shard)
+        if idle_guilds:
+            logging.info(f"Evicted {len(idle_guilds)} idle keyword shard(s)")
+    
     @commands.command(name='addkeyword')
+    @commands.guild_only()
     @commands.has_permissions(manage_guild=True)
     async def add_keyword(self, ctx, keyword: str, *, response: str):
-        """Add a keyword response"""
-        keyword = keyword.lower()
+        """Add a keyword response (prefix with re: or glob: for a pattern)"""
+        shard = self.get_shard(ctx.guild.id)
+        keywords = shard.keywords
+        keyword = normalize_keyword(keyword)
+        
+        if keyword not in keywords and is_pattern_keyword(keyword):
+            try:
+                compile_pattern_keyword(keyword)
+            except ValueError as e:
+                embed = discord.Embed(
+                    title="❌ Invalid Pattern",
+                    description=str(e),
+                    color=0xff0000
+                )
+                await ctx.send(embed=embed)
+                return
         
-        if keyword in self.keywords:
-            if response not in self.keywords[keyword]:
-                self.keywords[keyword].append(response)
+        if keyword in keywords:
+            if response not in keywords[keyword]:
+                keywords[keyword].append(response)
             else:
                 embed = discord.Embed(
                     title="❌ Response Already Exists",
@@ -61,9 +925,10 @@ class Keywords(commands.Cog):
                 await ctx.send(embed=embed)
                 return
         else:
-            self.keywords[keyword] = [response]
+            keywords[keyword] = [response]
+            shard.rebuild()
         
-        self.save_keywords()
+        self.save_shard(shard)
         
         embed = discord.Embed(
             title="✅ Keyword Added",
@@ -73,12 +938,15 @@ class Keywords(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='removekeyword', aliases=['delkeyword'])
+    @commands.guild_only()
     @commands.has_permissions(manage_guild=True)
     async def remove_keyword(self, ctx, keyword: str, response_index: int = None):
         """Remove a keyword or specific response"""
-        keyword = keyword.lower()
+        shard = self.get_shard(ctx.guild.id)
+        keywords = shard.keywords
+        keyword = normalize_keyword(keyword)
         
-        if keyword not in self.keywords:
+        if keyword not in keywords:
             embed = discord.Embed(
                 title="❌ Keyword Not Found",
                 description=f"Keyword '{keyword}' doesn't exist",
@@ -89,7 +957,8 @@ class Keywords(commands.Cog):
         
         if response_index is None:
             # Remove entire keyword
-            del self.keywords[keyword]
+            del keywords[keyword]
+            shard.rebuild()
             embed = discord.Embed(
                 title="✅ Keyword Removed",
                 description=f"Keyword '{keyword}' and all its responses have been removed",
@@ -99,12 +968,13 @@ class Keywords(commands.Cog):
             # Remove specific response
             try:
                 response_index -= 1  # Convert to 0-indexed
-                if 0 <= response_index < len(self.keywords[keyword]):
-                    removed_response = self.keywords[keyword].pop(response_index)
+                if 0 <= response_index < len(keywords[keyword]):
+                    removed_response = keywords[keyword].pop(response_index)
                     
                     # If no responses left, remove the keyword
-                    if not self.keywords[keyword]:
-                        del self.keywords[keyword]
+                    if not keywords[keyword]:
+                        del keywords[keyword]
+                        shard.rebuild()
                         embed = discord.Embed(
                             title="✅ Response Removed",
                             description=f"Last response removed for '{keyword}'. Keyword deleted.",
@@ -119,7 +989,7 @@ class Keywords(commands.Cog):
                 else:
                     embed = discord.Embed(
                         title="❌ Invalid Index",
-                        description=f"Response index must be between 1 and {len(self.keywords[keyword])}",
+                        description=f"Response index must be between 1 and {len(keywords[keyword])}",
                         color=0xff0000
                     )
                     await ctx.send(embed=embed)
@@ -133,73 +1003,214 @@ class Keywords(commands.Cog):
                 await ctx.send(embed=embed)
                 return
         
-        self.save_keywords()
+        self.save_shard(shard)
         await ctx.send(embed=embed)
     
-    @commands.command(name='keywords', aliases=['listkeywords'])
-    async def list_keywords(self, ctx):
-        """List all keywords and their responses"""
-        if not self.keywords:
+    @commands.command(name='keywordimport')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def import_keywords(self, ctx, mode: str = 'merge'):
+        """Import keywords from an attached JSON or CSV file (mode: merge or replace)"""
+        mode = mode.lower()
+        if mode not in ('merge', 'replace'):
             embed = discord.Embed(
-                title="📋 Keywords",
-                description="No keywords configured. Use `!addkeyword` to add some!",
-                color=0x0099ff
+                title="❌ Invalid Mode",
+                description="Mode must be `merge` or `replace`.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        attachment = ctx.message.attachments[0] if ctx.message.attachments else None
+        if attachment is None or not attachment.filename.lower().endswith(('.json', '.csv')):
+            embed = discord.Embed(
+                title="❌ No File Attached",
+                description="Attach a `.json` file (`{\"keyword\": [\"response\", ...]}`) or a `.csv` file (`keyword,response` rows).",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        if attachment.size > MAX_IMPORT_SIZE:
+            embed = discord.Embed(
+                title="❌ File Too Large",
+                description=f"Import files must be {MAX_IMPORT_SIZE // (1024 * 1024)} MB or less.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        imported, errors = parse_keyword_import(attachment.filename, await attachment.read())
+        if errors:
+            error_text = '\n'.join(errors[:10])
+            if len(errors) > 10:
+                error_text += f"\n... and {len(errors) - 10} more"
+            embed = discord.Embed(
+                title="❌ Import Rejected",
+                description=f"Nothing was imported. Fix these problems and try again:\n{error_text}",
+                color=0xff0000
             )
             await ctx.send(embed=embed)
             return
         
+        # Merge everything in one step, then rebuild and save once
+        shard = self.get_shard(ctx.guild.id)
+        if mode == 'replace':
+            shard.keywords.clear()
+        new_keywords = 0
+        new_responses = 0
+        for keyword, responses in imported.items():
+            existing = shard.keywords.get(keyword)
+            if existing is None:
+                existing = shard.keywords[keyword] = []
+                new_keywords += 1
+            for response in responses:
+                if response not in existing:
+                    existing.append(response)
+                    new_responses += 1
+        
+        shard.rebuild()
+        self.save_shard(shard)
+        
         embed = discord.Embed(
-            title="📋 Keywords & Responses",
-            color=0x0099ff
+            title="✅ Keywords Imported",
+            description=f"**Mode:** {mode}\n**New keywords:** {new_keywords}\n**New responses:** {new_responses}\n**Total keywords:** {len(shard.keywords)}",
+            color=0x00ff00
         )
+        await ctx.send(embed=embed)
+        logging.info(f"Imported {new_keywords} keywords in {ctx.guild.name} by {ctx.author}")
+    
+    @commands.command(name='keywordexport')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def export_keywords(self, ctx, file_format: str = 'json'):
+        """Export keywords as a JSON or CSV file"""
+        file_format = file_format.lower()
+        if file_format not in ('json', 'csv'):
+            embed = discord.Embed(
+                title="❌ Invalid Format",
+                description="Format must be `json` or `csv`.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
         
-        keyword_list = []
-        for i, (keyword, responses) in enumerate(self.keywords.items(), 1):
-            if i > 10:  # Limit to 10 keywords to avoid embed limits
-                keyword_list.append(f"... and {len(self.keywords) - 10} more")
-                break
-            
-            responses_text = '\n'.join([f"  {j}. {resp[:50]}{'...' if len(resp) > 50 else ''}" 
-                                      for j, resp in enumerate(responses, 1)])
-            keyword_list.append(f"**{keyword}**\n{responses_text}")
+        shard = self.get_shard(ctx.guild.id)
+        if file_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['keyword', 'response'])
+            for keyword, responses in shard.keywords.items():
+                for response in responses:
+                    writer.writerow([keyword, response])
+            content = buffer.getvalue()
+        else:
+            content = json.dumps(shard.keywords, indent=2, ensure_ascii=False)
         
-        embed.description = '\n\n'.join(keyword_list)
+        file = discord.File(io.BytesIO(content.encode('utf-8')), filename=f"keywords_{ctx.guild.id}.{file_format}")
+        await ctx.send(f"📦 Exported {len(shard.keywords)} keyword(s)", file=file)
+    
+    @commands.command(name='enablepattern')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def enable_pattern(self, ctx, *, keyword: str):
+        """Re-enable a pattern keyword that was disabled for being too slow"""
+        shard = self.get_shard(ctx.guild.id)
+        keyword = normalize_keyword(keyword)
         
-        if len(self.keywords) > 10:
-            embed.set_footer(text=f"Showing 10 of {len(self.keywords)} keywords")
+        if keyword not in shard.disabled_patterns:
+            embed = discord.Embed(
+                title="❌ Pattern Not Disabled",
+                description=f"'{keyword}' is not a disabled pattern keyword.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
         
+        shard.enable_pattern(keyword)
+        self.save_stats(shard)
+        
+        embed = discord.Embed(
+            title="✅ Pattern Enabled",
+            description=f"Pattern keyword '{keyword}' is active again.",
+            color=0x00ff00
+        )
         await ctx.send(embed=embed)
     
+    @commands.command(name='keywords', aliases=['listkeywords'])
+    @commands.guild_only()
+    async def list_keywords(self, ctx):
+        """List all keywords and their responses"""
+        shard = self.get_shard(ctx.guild.id)
+        keywords = shard.keywords
+        
+        if not keywords:
+            embed = discord.Embed(
+                title="📋 Keywords",
+                description="No keywords configured. Use `!addkeyword` to add some!",
+                color=0x0099ff
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        view = KeywordPageView(shard, ctx.author.id)
+        view.message = await ctx.send(embed=view.build_embed(), view=view)
+    
     @commands.command(name='searchkeyword')
+    @commands.guild_only()
     async def search_keyword(self, ctx, *, keyword: str):
-        """Search for a specific keyword"""
-        keyword = keyword.lower()
+        """Search keywords by exact name, substring or close spelling"""
+        shard = self.get_shard(ctx.guild.id)
+        keywords = shard.keywords
+        keyword = normalize_keyword(keyword)
+        results = shard.search(keyword)
         
-        if keyword not in self.keywords:
+        if not results:
             embed = discord.Embed(
                 title="❌ Keyword Not Found",
-                description=f"No responses found for '{keyword}'",
+                description=f"No keywords match '{keyword}'",
                 color=0xff0000
             )
             await ctx.send(embed=embed)
             return
         
-        responses = self.keywords[keyword]
-        embed = discord.Embed(
-            title=f"🔍 Keyword: {keyword}",
-            color=0x0099ff
-        )
-        
-        responses_text = '\n'.join([f"{i}. {resp}" for i, resp in enumerate(responses, 1)])
-        embed.description = responses_text
-        embed.set_footer(text=f"{len(responses)} response(s)")
+        if keyword in keywords:
+            responses = keywords[keyword]
+            embed = discord.Embed(
+                title=f"🔍 Keyword: {keyword}",
+                color=0x0099ff
+            )
+            
+            responses_text = '\n'.join([f"{i}. {resp}" for i, resp in enumerate(responses, 1)])
+            embed.description = responses_text[:4000]
+            embed.set_footer(text=f"{len(responses)} response(s)")
+            
+            related = [match for match, _, _ in results if match != keyword][:5]
+            if related:
+                embed.add_field(name="Related Keywords", value=', '.join(related)[:1024], inline=False)
+        else:
+            embed = discord.Embed(
+                title=f"🔍 Keywords matching '{keyword}'",
+                color=0x0099ff
+            )
+            
+            results_text = []
+            for i, (match, kind, similarity) in enumerate(results, 1):
+                detail = f"{similarity:.0%} similar" if kind == "fuzzy" else kind
+                results_text.append(f"{i}. **{match[:100]}** ({detail}, {len(keywords[match])} response(s))")
+            embed.description = '\n'.join(results_text)
+            embed.set_footer(text=f"Use {ctx.prefix}searchkeyword <keyword> with an exact keyword to see its responses")
         
         await ctx.send(embed=embed)
     
     @commands.command(name='keywordstats')
+    @commands.guild_only()
     async def keyword_stats(self, ctx):
         """Show keyword statistics"""
-        if not self.keywords:
+        shard = self.get_shard(ctx.guild.id)
+        keywords = shard.keywords
+        
+        if not keywords:
             embed = discord.Embed(
                 title="📊 Keyword Statistics",
                 description="No keywords configured.",
@@ -208,13 +1219,13 @@ class Keywords(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        total_keywords = len(self.keywords)
-        total_responses = sum(len(responses) for responses in self.keywords.values())
+        total_keywords = len(keywords)
+        total_responses = sum(len(responses) for responses in keywords.values())
         avg_responses = total_responses / total_keywords if total_keywords > 0 else 0
         
         # Find most/least responses
-        most_responses = max(self.keywords.items(), key=lambda x: len(x[1]))
-        least_responses = min(self.keywords.items(), key=lambda x: len(x[1]))
+        most_responses = max(keywords.items(), key=lambda x: len(x[1]))
+        least_responses = min(keywords.items(), key=lambda x: len(x[1]))
         
         embed = discord.Embed(
             title="📊 Keyword Statistics",
@@ -227,30 +1238,112 @@ class Keywords(commands.Cog):
         embed.add_field(name="Most Responses", value=f"{most_responses[0]} ({len(most_responses[1])})", inline=True)
         embed.add_field(name="Least Responses", value=f"{least_responses[0]} ({len(least_responses[1])})", inline=True)
         
+        # Trigger rates since counters started
+        hours = max((time.time() - shard.stats_since) / 3600, 1 / 60)
+        trigger_percent = shard.triggers / shard.messages_scanned * 100 if shard.messages_scanned else 0
+        embed.add_field(name="Messages Scanned", value=str(shard.messages_scanned), inline=True)
+        embed.add_field(name="Triggers", value=f"{shard.triggers} ({trigger_percent:.1f}%)", inline=True)
+        embed.add_field(name="Triggers/Hour", value=f"{shard.triggers / hours:.1f}", inline=True)
+        embed.add_field(name="Throttled Replies", value=str(shard.throttled), inline=True)
+        
+        # Hottest and dead keywords
+        top_hits = sorted(shard.hits.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_text = '\n'.join([f"{keyword} ({count})" for keyword, count in top_hits]) or "No hits yet"
+        unused = sum(1 for keyword in keywords if not shard.hits.get(keyword))
+        embed.add_field(name="Top Keywords", value=top_text, inline=True)
+        embed.add_field(name="Never Triggered", value=f"{unused} keyword(s)", inline=True)
+        
+        pattern_total = sum(1 for keyword in keywords if is_pattern_keyword(keyword))
+        if pattern_total:
+            disabled_text = ', '.join(sorted(shard.disabled_patterns))[:200] or "none"
+            embed.add_field(name="Pattern Keywords", value=f"{pattern_total} total\nDisabled: {disabled_text}", inline=True)
+        
+        # Match step latency (since shard was loaded)
+        if shard.latency.total:
+            p50 = shard.latency.percentile(0.5)
+            p99 = shard.latency.percentile(0.99)
+            latency_text = (f"avg {shard.latency.mean():.1f}µs\n"
+                            f"p50 ≤ {p50}µs\np99 ≤ {p99}µs")
+        else:
+            latency_text = "No samples yet"
+        embed.add_field(name="Match Latency", value=latency_text, inline=True)
+        
+        embed.set_footer(text="Counters since")
+        embed.timestamp = datetime.fromtimestamp(shard.stats_since)
+        
         await ctx.send(embed=embed)
     
     @commands.Cog.listener()
     async def on_message(self, message):
         """Listen for keywords in messages"""
-        # Ignore bot messages and commands
-        if message.author.bot or message.content.startswith(self.bot.command_prefix):
+        # Ignore bot messages, commands and DMs
+        if message.author.bot or message.guild is None or message.content.startswith(self.bot.command_prefix):
             return
         
-        # Check for keywords in message
+        # Check for keywords in message (single pass, first keyword in table order wins)
+        shard = self.get_shard(message.guild.id)
+        start = time.perf_counter()
         message_content = message.content.lower()
+        keyword = shard.match(
+            message_content,
+            self.bot.config.get('keyword_pattern_budget_ms', 5) / 1000,
+            self.bot.config.get('keyword_pattern_max_strikes', 3)
+        )
+        shard.record_scan(keyword, (time.perf_counter() - start) * 1_000_000)
+        if keyword is None:
+            return
         
-        for keyword, responses in self.keywords.items():
-            # Check if keyword is in message (word boundary matching)
-            if re.search(r'\b' + re.escape(keyword) + r'\b', message_content):
-                try:
-                    # Pick a random response
-                    import random
-                    response = random.choice(responses)
-                    await message.channel.send(response)
-                    logging.info(f"Keyword '{keyword}' triggered in {message.guild.name}")
-                    break  # Only respond to first matched keyword
-                except Exception as e:
-                    logging.error(f"Error responding to keyword '{keyword}': {e}")
+        # Keep replies within the channel and keyword budgets
+        config = self.bot.config
+        now = time.monotonic()
+        if now - self.throttle.last_sweep >= SHARD_SWEEP_INTERVAL:
+            self.throttle.sweep(now, config)
+        
+        channel_id = message.channel.id
+        keyword_key = (message.guild.id, keyword)
+        if not self.throttle.allow(channel_id, keyword_key, now, config):
+            shard.throttled += 1
+            shard.stats_dirty = True
+            if config.get('keyword_throttle_mode', 'drop') == 'coalesce':
+                # Remember only the latest keyword; one delayed reply covers the burst
+                if channel_id not in self.throttle.pending:
+                    delay = self.throttle.retry_after(channel_id, keyword_key, config)
+                    task = asyncio.create_task(self.send_coalesced_reply(message.channel, message.guild, delay))
+                    self.reply_tasks.add(task)
+                    task.add_done_callback(self.reply_tasks.discard)
+                self.throttle.pending[channel_id] = keyword
+            return
+        
+        await self.send_keyword_reply(message.channel, message.guild, shard, keyword)
+    
+    async def send_keyword_reply(self, channel, guild, shard, keyword):
+        """Send a random response for a matched keyword"""
+        try:
+            # Pick a random response
+            response = random.choice(shard.keywords[keyword])
+            await channel.send(response)
+            logging.info(f"Keyword '{keyword}' triggered in {guild.name}")
+        except Exception as e:
+            logging.error(f"Error responding to keyword '{keyword}': {e}")
+    
+    async def send_coalesced_reply(self, channel, guild, delay):
+        """Send a single reply for keywords suppressed during a burst"""
+        while True:
+            await asyncio.sleep(delay)
+            keyword = self.throttle.pending.get(channel.id)
+            shard = self.get_shard(guild.id)
+            if keyword is None or keyword not in shard.keywords:
+                self.throttle.pending.pop(channel.id, None)
+                return
+            
+            # The latest keyword may have a different budget than the one the delay was
+            # computed for; wait for it rather than dropping the reply
+            keyword_key = (guild.id, keyword)
+            if self.throttle.allow(channel.id, keyword_key, time.monotonic(), self.bot.config):
+                del self.throttle.pending[channel.id]
+                await self.send_keyword_reply(channel, guild, shard, keyword)
+                return
+            delay = self.throttle.retry_after(channel.id, keyword_key, self.bot.config)
     
     # Slash command versions
     @app_commands.command(name="addkeyword", description="Add a keyword response")
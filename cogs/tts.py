@@ -2,15 +2,798 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
+import bisect
+import hashlib
+import heapq
+import io
 import os
-import tempfile
+import re
+import shutil
+import subprocess
+import time
+import uuid
+import wave
 import logging
-from gtts import gTTS
+import psutil
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from gtts import gTTS
+except ImportError:
+    gTTS = None  # Offline deployments can run on a local engine only
+
+OPUS_BITRATE = 64  # kbps; plenty for speech
+SENTENCE_END = re.compile(r'(?<=[.!?;…])\s+|\n+')
+
+def encode_opus(source, filename):
+    """Transcode synthesized audio (bytes or a file) to Ogg Opus (blocking, runs on the worker pool)"""
+    from_pipe = isinstance(source, bytes)
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-y', '-i', 'pipe:0' if from_pipe else source,
+         '-vn', '-ac', '2', '-ar', '48000', '-c:a', 'libopus', '-b:a', f'{OPUS_BITRATE}k', '-f', 'ogg', filename],
+        input=source if from_pipe else None, capture_output=True, check=True
+    )
+
+def split_text(text, max_chars):
+    """Split text into speakable chunks at sentence boundaries
+    
+    The first chunk is a single sentence so playback starts quickly; later
+    sentences are packed together up to max_chars. Sentences longer than
+    max_chars are cut at a comma or space.
+    """
+    sentences = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(', ', max_chars // 2, max_chars) + 1 or sentence.rfind(' ', 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            sentences.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+    
+    chunks = sentences[:1]
+    for sentence in sentences[1:]:
+        if len(chunks) > 1 and len(chunks[-1]) + 1 + len(sentence) <= max_chars:
+            chunks[-1] += ' ' + sentence
+        else:
+            chunks.append(sentence)
+    return chunks
+
+class TTSEngine:
+    """Speech synthesis backend; render() is blocking and runs on the cog's worker pool"""
+    name = None
+    spawns_process = False  # Whether render() runs a subprocess that counts against the audio budget
+    
+    @property
+    def voice(self):
+        """Identifies this engine's rendering in the clip cache"""
+        raise NotImplementedError
+    
+    def render(self, text, filename=None):
+        """Synthesize text; returns the audio bytes, or None after writing them to filename"""
+        raise NotImplementedError
+    
+    @staticmethod
+    def output(data, filename):
+        """Return data, or write it to filename when one is given"""
+        if filename is None:
+            return data
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return None
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS; one network round trip per utterance"""
+    name = 'gtts'
+    
+    def __init__(self, config):
+        if gTTS is None:
+            raise RuntimeError("gTTS is not installed")
+        self.lang = config.get('tts_language', 'en')
+    
+    @property
+    def voice(self):
+        return f"gtts:{self.lang}"
+    
+    def render(self, text, filename=None):
+        tts = gTTS(text=text, lang=self.lang, slow=False)
+        if filename is not None:
+            tts.save(filename)
+            return None
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        return buffer.getvalue()
+
+class EspeakEngine(TTSEngine):
+    """Local espeak-ng synthesis; no network needed"""
+    name = 'espeak'
+    spawns_process = True
+    
+    def __init__(self, config):
+        self.executable = shutil.which('espeak-ng') or shutil.which('espeak')
+        if self.executable is None:
+            raise RuntimeError("espeak-ng is not installed")
+        self.voice_name = config.get('tts_espeak_voice', 'en-us')
+        self.speed = config.get('tts_espeak_speed', 160)
+        self.timeout = config.get('tts_synth_timeout', 15)
+    
+    @property
+    def voice(self):
+        return f"espeak:{self.voice_name}:{self.speed}"
+    
+    def render(self, text, filename=None):
+        result = subprocess.run(
+            [self.executable, '--stdin', '--stdout', '-v', self.voice_name, '-s', str(self.speed)],
+            input=text.encode('utf-8'), capture_output=True, check=True, timeout=self.timeout
+        )
+        return self.output(result.stdout, filename)
+
+class PiperEngine(TTSEngine):
+    """Local neural synthesis with piper; needs a downloaded voice model"""
+    name = 'piper'
+    spawns_process = True
+    
+    def __init__(self, config):
+        self.executable = shutil.which(config.get('tts_piper_executable', 'piper'))
+        if self.executable is None:
+            raise RuntimeError("piper is not installed")
+        self.model = config.get('tts_piper_model')
+        if not self.model or not os.path.exists(self.model):
+            raise RuntimeError("tts_piper_model must point to a piper voice model (.onnx)")
+        self.sample_rate = config.get('tts_piper_sample_rate', 22050)
+        self.timeout = config.get('tts_synth_timeout', 15)
+    
+    @property
+    def voice(self):
+        return f"piper:{os.path.basename(self.model)}"
+    
+    def render(self, text, filename=None):
+        result = subprocess.run(
+            [self.executable, '--model', self.model, '--output-raw'],
+            input=text.encode('utf-8'), capture_output=True, check=True, timeout=self.timeout
+        )
+        # Raw 16-bit mono PCM; wrap it in a WAV header so FFmpeg can identify it
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(result.stdout)
+        return self.output(buffer.getvalue(), filename)
+
+TTS_ENGINES = {engine.name: engine for engine in (GTTSEngine, EspeakEngine, PiperEngine)}
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task"""
+    def __init__(self, interval=0.5, window=240):
+        self.interval = interval
+        self.samples = deque(maxlen=window)  # Lag in seconds for the last ~2 minutes
+    
+    async def run(self):
+        """Sleep in a loop and record the overshoot of every wakeup"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+    
+    def summary(self):
+        """(average, maximum) lag in seconds, or None without samples"""
+        if not self.samples:
+            return None
+        return sum(self.samples) / len(self.samples), max(self.samples)
+
+class RollingHistogram:
+    """Fixed-bucket latency histogram in milliseconds covering the last one to two windows"""
+    BOUNDS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+    
+    def __init__(self, window=600):
+        self.window = window
+        self.current = [0] * (len(self.BOUNDS) + 1)
+        self.previous = [0] * (len(self.BOUNDS) + 1)
+        self.rotated = time.monotonic()
+    
+    def rotate(self):
+        """Start a new window once the current one is full"""
+        elapsed = time.monotonic() - self.rotated
+        if elapsed < self.window:
+            return
+        self.previous = self.current if elapsed < 2 * self.window else [0] * (len(self.BOUNDS) + 1)
+        self.current = [0] * (len(self.BOUNDS) + 1)
+        self.rotated = time.monotonic()
+    
+    def record(self, millis):
+        """Add one latency sample"""
+        self.rotate()
+        self.current[bisect.bisect_left(self.BOUNDS, millis)] += 1
+    
+    def counts(self):
+        """Bucket counts over the retained windows"""
+        self.rotate()
+        return [a + b for a, b in zip(self.current, self.previous)]
+    
+    def percentile(self, fraction):
+        """Upper bucket bound containing the given fraction of samples, or None without samples"""
+        counts = self.counts()
+        total = sum(counts)
+        if not total:
+            return None
+        running = 0
+        for bound, count in zip(self.BOUNDS, counts):
+            running += count
+            if running >= fraction * total:
+                return bound
+        return float('inf')
+
+class IdleTimers:
+    """Per-guild deadlines driven by a single scheduler task instead of one sleeper each"""
+    def __init__(self, callback):
+        self.callback = callback  # Coroutine function called with the guild ID when its timer fires
+        self.deadlines = {}  # guild ID -> monotonic deadline of the armed timer
+        self.heap = []  # (deadline, guild ID); entries no longer in deadlines are stale
+        self.tasks = set()  # Callbacks still running, referenced so they are not collected
+        self.wake = asyncio.Event()
+    
+    def arm(self, guild_id, delay):
+        """Start (or restart) a guild's timer"""
+        deadline = time.monotonic() + delay
+        self.deadlines[guild_id] = deadline
+        heapq.heappush(self.heap, (deadline, guild_id))
+        self.wake.set()
+    
+    def cancel(self, guild_id):
+        """Disarm a guild's timer; its heap entry is dropped lazily"""
+        self.deadlines.pop(guild_id, None)
+    
+    def is_armed(self, guild_id):
+        return guild_id in self.deadlines
+    
+    async def run(self):
+        """Sleep until the earliest deadline, fire due timers, repeat"""
+        while True:
+            while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            
+            self.wake.clear()
+            if not self.heap:
+                await self.wake.wait()
+                continue
+            
+            delay = self.heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # Fire without waiting, so a slow disconnect doesn't delay other guilds
+            _, guild_id = heapq.heappop(self.heap)
+            del self.deadlines[guild_id]
+            task = asyncio.create_task(self.callback(guild_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.report)
+    
+    def cancel_all(self):
+        """Cancel timer callbacks that are still running"""
+        for task in self.tasks:
+            task.cancel()
+    
+    def report(self, task):
+        """Forget a finished timer callback and log it if it failed"""
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error(f"Error in idle timer: {task.exception()}")
+
+class AudioProcessBudget:
+    """Global cap on concurrent audio subprocesses and their memory, with FIFO queueing
+    
+    Every child process of the bot is an audio worker (FFmpeg playback and
+    encoding, local TTS engines), so accounting samples psutil's children.
+    """
+    def __init__(self, max_processes, max_rss):
+        self.max_processes = max_processes
+        self.max_rss = max_rss
+        self.active = 0
+        self.waiters = deque()
+        self.processes = {}  # pid -> psutil.Process, kept so cpu_percent() has a baseline
+        self.started = 0
+        self.queued = 0  # Acquisitions that had to wait
+    
+    def sample(self):
+        """(name, pid, rss bytes, cpu percent) for each live audio subprocess"""
+        rows = []
+        processes = {}
+        try:
+            children = psutil.Process().children(recursive=True)
+        except psutil.Error:
+            children = []
+        for child in children:
+            process = self.processes.get(child.pid, child)
+            try:
+                with process.oneshot():
+                    rows.append((process.name(), process.pid, process.memory_info().rss, process.cpu_percent(None)))
+            except psutil.Error:
+                continue
+            processes[process.pid] = process
+        self.processes = processes
+        return rows
+    
+    def has_room(self):
+        """Whether another process may start; one is always allowed so work can't stall"""
+        if self.active == 0:
+            return True
+        if self.active >= self.max_processes:
+            return False
+        return sum(row[2] for row in self.sample()) < self.max_rss
+    
+    async def acquire(self):
+        """Wait for a process slot"""
+        if not self.waiters and self.has_room():
+            self.active += 1
+            self.started += 1
+            return
+        
+        self.queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Granted a slot just as we were cancelled
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+    
+    def release(self):
+        """Give back a slot and admit queued processes that now fit"""
+        self.active -= 1
+        while self.waiters and self.has_room():
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                self.started += 1
+                waiter.set_result(None)
+    
+    def usage(self):
+        """Snapshot for diagnostics"""
+        rows = self.sample()
+        return {
+            'active': self.active,
+            'max_processes': self.max_processes,
+            'waiting': len(self.waiters),
+            'started': self.started,
+            'queued': self.queued,
+            'rss': sum(row[2] for row in rows),
+            'max_rss': self.max_rss,
+            'cpu_percent': sum(row[3] for row in rows),
+            'processes': rows
+        }
+
+class TTSCache:
+    """Content-addressed on-disk cache of Opus-encoded clips with LRU eviction"""
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index = OrderedDict()  # key -> file size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recent_misses = OrderedDict()  # Keys missed once, for admission of repeats
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+    
+    @staticmethod
+    def key(text, voice):
+        """Hash identifying one rendering of text by an engine voice"""
+        return hashlib.sha256(f"{voice}\0{text}".encode('utf-8')).hexdigest()
+    
+    def path(self, key):
+        """Cache file for a key"""
+        return os.path.join(self.directory, f"{key}.opus")
+    
+    def temp_path(self, key):
+        """Unique scratch file in the cache directory, renamed into place by put()"""
+        return os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp")
+    
+    def load_index(self):
+        """Rebuild the in-memory index from the cache directory, oldest access first"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.opus'):
+                stat = entry.stat()
+                entries.append((max(stat.st_atime, stat.st_mtime), entry.name[:-5], stat.st_size))
+            elif entry.name.endswith(('.tmp', '.mp3')):
+                os.unlink(entry.path)  # Interrupted synthesis, or a clip from before Opus caching
+        for _, key, size in sorted(entries):
+            self.index[key] = size
+            self.total_bytes += size
+        self.evict()
+    
+    def get(self, key):
+        """Path of a cached clip, or None on a miss"""
+        if key in self.index:
+            self.index.move_to_end(key)
+            self.hits += 1
+            return self.path(key)
+        self.misses += 1
+        return None
+    
+    def admit(self, key):
+        """Whether an in-memory clip is worth writing to disk: only once it has been requested twice"""
+        if self.recent_misses.pop(key, None) is not None:
+            return True
+        self.recent_misses[key] = True
+        if len(self.recent_misses) > 1024:
+            self.recent_misses.popitem(last=False)
+        return False
+    
+    def put(self, key, temp_filename):
+        """Move a freshly encoded Opus file into the cache and return its path"""
+        filename = self.path(key)
+        os.replace(temp_filename, filename)
+        self.total_bytes -= self.index.pop(key, 0)
+        self.index[key] = os.path.getsize(filename)
+        self.total_bytes += self.index[key]
+        self.evict(keep=key)
+        return filename
+    
+    def evict(self, keep=None):
+        """Delete least recently used clips until the cache fits its size cap"""
+        while self.total_bytes > self.max_bytes and self.index:
+            key, size = next(iter(self.index.items()))
+            if key == keep:
+                break
+            del self.index[key]
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+class AudioClip:
+    """A rendered utterance: a cached Opus file, or engine output held in memory"""
+    __slots__ = ('filename', 'data', 'synth', 'encode')
+    
+    def __init__(self, filename=None, data=None, synth=None, encode=None):
+        self.filename = filename
+        self.data = data
+        self.synth = synth  # Seconds spent synthesizing, None for cache hits
+        self.encode = encode  # Seconds spent encoding to Opus before playback, if any
+    
+    def source(self):
+        """Opus audio source, so discord.py sends packets without encoding PCM in-process
+        
+        Cached clips are already Opus and FFmpeg only demuxes them; in-memory
+        clips are piped into FFmpeg's stdin and encoded there.
+        """
+        if self.data is not None:
+            return discord.FFmpegOpusAudio(io.BytesIO(self.data), pipe=True, bitrate=OPUS_BITRATE)
+        return discord.FFmpegOpusAudio(self.filename, codec='copy')
+
+class TimedSource(discord.AudioSource):
+    """Wraps an audio source to report when its first packet is read for sending"""
+    def __init__(self, source, on_first_packet):
+        self.source = source
+        self.on_first_packet = on_first_packet  # Called on the audio thread
+    
+    def read(self):
+        data = self.source.read()
+        if self.on_first_packet is not None:
+            callback, self.on_first_packet = self.on_first_packet, None
+            callback()
+        return data
+    
+    def is_opus(self):
+        return self.source.is_opus()
+    
+    def cleanup(self):
+        self.source.cleanup()
+
+class TTSRequest:
+    """One queued utterance, split into chunks that render a few ahead of playback"""
+    def __init__(self, text, author, channel, chunks, render, join=None):
+        self.text = text
+        self.author = author
+        self.channel = channel  # Text channel for status messages
+        self.chunks = chunks
+        self.render = render  # Starts rendering one chunk, returning a task resolving to its AudioClip
+        self.tasks = []
+        self.cancelled = False
+        self.created = time.perf_counter()
+        self.join = join  # Seconds spent connecting to voice for this request, if it had to
+    
+    def prefetch(self, count):
+        """Make sure the first count chunks are rendering"""
+        if self.cancelled:
+            return
+        while len(self.tasks) < min(count, len(self.chunks)):
+            self.tasks.append(self.render(self.chunks[len(self.tasks)]))
+    
+    def ready(self):
+        """Whether the first chunk can play right away"""
+        return bool(self.tasks) and self.tasks[0].done()
+    
+    def cancel(self):
+        """Stop after the current chunk and cancel any rendering"""
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
+
+class GuildPlayer:
+    """Per-guild TTS queue that plays clips back to back"""
+    def __init__(self, cog, guild):
+        self.cog = cog
+        self.guild = guild
+        self.pending = deque()
+        self.current = None
+        self.task = None
+    
+    def enqueue(self, request):
+        """Queue a request and make sure the player loop is running"""
+        request.prefetch(1)  # The first chunk renders while earlier requests play
+        self.pending.append(request)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.play_loop())
+    
+    def busy(self):
+        """Whether a request is playing, still rendering its first chunk or waiting its turn"""
+        return bool(self.pending) or (self.current is not None and not self.current.cancelled)
+    
+    def clear(self):
+        """Drop queued requests, stop the current one after its chunk and cancel their synthesis"""
+        if self.current is not None:
+            self.current.cancel()
+        while self.pending:
+            self.pending.popleft().cancel()
+    
+    async def play_loop(self):
+        """Play queued requests chunk by chunk, in order, until the queue is empty"""
+        loop = asyncio.get_running_loop()
+        lookahead = self.cog.bot.config.get('tts_chunk_lookahead', 2)
+        while self.pending:
+            request = self.current = self.pending.popleft()
+            for index in range(len(request.chunks)):
+                if request.cancelled:
+                    break
+                # Later chunks render while this one plays
+                request.prefetch(index + 1 + lookahead)
+                try:
+                    clip = await request.tasks[index]
+                except asyncio.CancelledError:
+                    break
+                except asyncio.TimeoutError:
+                    logging.error(f"TTS synthesis timed out in {self.guild.name}")
+                    await self.notify(request, "❌ TTS Timed Out", "Speech synthesis took too long. Please try again.")
+                    request.cancel()
+                    break
+                except Exception as e:
+                    logging.error(f"TTS error: {e}")
+                    await self.notify(request, "❌ TTS Error", "Failed to generate text-to-speech audio.")
+                    request.cancel()
+                    break
+                
+                # Each playback runs an FFmpeg process, so it waits for room in the global budget
+                await self.cog.audio_budget.acquire()
+                try:
+                    if request.cancelled:
+                        break  # Stopped while waiting for a slot
+                    voice_client = self.guild.voice_client
+                    if voice_client is None or not voice_client.is_connected():
+                        self.clear()
+                        break
+                    
+                    # The audio thread callbacks hand their events back to the loop
+                    finished = asyncio.Event()
+                    def after(error):
+                        self.cog.playback_finished(error)
+                        loop.call_soon_threadsafe(finished.set)
+                    
+                    started = time.perf_counter()
+                    def first_packet(request=request, index=index, clip=clip, started=started):
+                        loop.call_soon_threadsafe(self.first_packet, request, index, clip, started, time.perf_counter())
+                    
+                    try:
+                        voice_client.play(TimedSource(clip.source(), first_packet), after=after)
+                    except discord.ClientException as e:
+                        logging.error(f"TTS playback error: {e}")
+                        request.cancel()
+                        break
+                    await finished.wait()
+                finally:
+                    self.cog.audio_budget.release()
+        
+        self.current = None
+    
+    def first_packet(self, request, index, clip, started, sent):
+        """Record stage latencies once a chunk's first packet is on its way"""
+        stages = {
+            'synth': clip.synth,
+            'encode': clip.encode,
+            'first_packet': sent - started
+        }
+        if index == 0:
+            stages['join'] = request.join
+            stages['total'] = sent - request.created
+        for stage, seconds in stages.items():
+            if seconds is not None:
+                self.cog.record_stage(self.guild.id, stage, seconds)
+        
+        if index == 0:
+            fields = {stage: round(seconds * 1000, 1) for stage, seconds in stages.items() if seconds is not None}
+            fields.update(guild=self.guild.id, chunks=len(request.chunks), cached=clip.synth is None)
+            logging.info(
+                f"TTS played in {self.guild.name} by {request.author} " + " ".join(f"{key}={value}" for key, value in fields.items()),
+                extra={'tts_latency': fields}
+            )
+    
+    async def notify(self, request, title, description):
+        """Tell the requester's channel that their request failed"""
+        embed = discord.Embed(title=title, description=description, color=0xff0000)
+        try:
+            await request.channel.send(embed=embed)
+        except discord.HTTPException:
+            pass
 
 class TTS(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.voice_clients = {}  # Store voice clients for each guild
+        self.players = {}  # Per-guild TTS queues
+        
+        # Synthesis is blocking network, disk or subprocess work, so it runs on a bounded
+        # worker pool; every engine shares the pool (the synthesis limit) and the clip cache
+        self.worker_count = self.bot.config.get('tts_workers', 4)
+        self.executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix='tts')
+        self.synth_times = deque(maxlen=200)  # Seconds each synthesis would have blocked the event loop
+        self.synth_timeouts = 0
+        self.engines = {}  # Engine name -> instance, created on first use
+        self.engine_times = {}  # Engine name -> recent synthesis seconds
+        self.stage_latency = {}  # guild ID -> stage -> RollingHistogram
+        self.cache = TTSCache('data/tts_cache', self.bot.config.get('tts_cache_max_mb', 100) * 1024 * 1024)
+        self.cache_tasks = set()  # Background cache writes, referenced so they are not collected mid-encode
+        self.audio_budget = AudioProcessBudget(
+            self.bot.config.get('tts_audio_processes', 8),
+            self.bot.config.get('tts_audio_memory_mb', 256) * 1024 * 1024
+        )
+        self.lag_monitor = LoopLagMonitor()
+        self.lag_task = self.bot.loop.create_task(self.lag_monitor.run())
+        self.idle_timers = IdleTimers(self.disconnect_if_idle)
+        self.idle_task = self.bot.loop.create_task(self.idle_timers.run())
+    
+    def cog_unload(self):
+        """Stop background work when the cog is unloaded"""
+        self.lag_task.cancel()
+        self.idle_task.cancel()
+        self.idle_timers.cancel_all()
+        for task in self.cache_tasks:
+            task.cancel()
+        for player in self.players.values():
+            player.clear()
+            if player.task:
+                player.task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_engine(self, guild_id):
+        """TTS engine for a guild: tts_guild_engines overrides the tts_engine default"""
+        name = self.bot.config.get('tts_guild_engines', {}).get(str(guild_id), self.bot.config.get('tts_engine', 'gtts'))
+        engine = self.engines.get(name)
+        if engine is None:
+            if name not in TTS_ENGINES:
+                raise RuntimeError(f"Unknown TTS engine '{name}'")
+            engine = self.engines[name] = TTS_ENGINES[name](self.bot.config)
+        return engine
+    
+    def render_speech(self, engine, text, filename=None):
+        """Render speech with an engine (blocking, runs on the worker pool)
+        
+        Returns (bytes, seconds); bytes is None when written to filename.
+        """
+        start = time.perf_counter()
+        data = engine.render(text, filename)
+        return data, time.perf_counter() - start
+    
+    async def submit_audio_process(self, func, *args):
+        """Run a blocking call that spawns an audio subprocess on the worker pool, within the process budget"""
+        await self.audio_budget.acquire()
+        loop = asyncio.get_running_loop()
+        job = self.executor.submit(func, *args)
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(self.audio_budget.release))
+        return job
+    
+    async def synthesize(self, engine, text, filename=None):
+        """Render speech off the event loop, raising asyncio.TimeoutError if it takes too long
+        
+        Returns the audio bytes, or None when a filename is given. A timed-out
+        worker thread cannot be interrupted; it finishes in the background
+        (the pool stays bounded) and its file is removed afterwards.
+        """
+        timeout = self.bot.config.get('tts_synth_timeout', 15)
+        if engine.spawns_process:
+            job = await self.submit_audio_process(self.render_speech, engine, text, filename)
+        else:
+            job = self.executor.submit(self.render_speech, engine, text, filename)
+        try:
+            data, elapsed = await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.synth_timeouts += 1
+            if filename is not None:
+                job.add_done_callback(lambda _: self.cleanup_temp_file(filename, None))
+            raise
+        self.synth_times.append(elapsed)
+        self.engine_times.setdefault(engine.name, deque(maxlen=200)).append(elapsed)
+        return data
+    
+    async def prepare_audio(self, text, engine):
+        """AudioClip for text spoken by engine, from the cache or freshly synthesized
+        
+        In the default memory mode a new clip never touches the disk before
+        playback; it is written to the cache in the background once the same
+        text has been requested twice. File mode synthesizes to a temp file
+        and encodes it into the cache before playing.
+        """
+        key = self.cache.key(text, engine.voice)
+        filename = self.cache.get(key)
+        if filename is not None:
+            return AudioClip(filename=filename)
+        
+        start = time.perf_counter()
+        if self.bot.config.get('tts_audio_mode', 'memory') == 'file':
+            raw_filename = self.cache.temp_path(key)
+            opus_filename = self.cache.temp_path(key)
+            try:
+                await self.synthesize(engine, text, raw_filename)
+                synthesized = time.perf_counter()
+                await asyncio.wrap_future(await self.submit_audio_process(encode_opus, raw_filename, opus_filename))
+            except Exception:
+                self.cleanup_temp_file(opus_filename, None)
+                raise
+            finally:
+                self.cleanup_temp_file(raw_filename, None)
+            return AudioClip(filename=self.cache.put(key, opus_filename), synth=synthesized - start, encode=time.perf_counter() - synthesized)
+        
+        data = await self.synthesize(engine, text)
+        if self.cache.admit(key):
+            task = asyncio.create_task(self.store_clip(key, data))
+            self.cache_tasks.add(task)
+            task.add_done_callback(self.cache_tasks.discard)
+        return AudioClip(data=data, synth=time.perf_counter() - start)
+    
+    async def store_clip(self, key, data):
+        """Encode an in-memory clip into the cache off the playback path"""
+        temp_filename = self.cache.temp_path(key)
+        try:
+            await asyncio.wrap_future(await self.submit_audio_process(encode_opus, data, temp_filename))
+            self.cache.put(key, temp_filename)
+        except Exception as e:
+            logging.error(f"Error caching TTS clip: {e}")
+            self.cleanup_temp_file(temp_filename, None)
+    
+    def record_stage(self, guild_id, stage, seconds):
+        """Add one stage timing to a guild's rolling histograms"""
+        histograms = self.stage_latency.setdefault(guild_id, {})
+        if stage not in histograms:
+            histograms[stage] = RollingHistogram()
+        histograms[stage].record(seconds * 1000)
+    
+    def get_player(self, guild):
+        """Return the TTS queue for a guild, creating it on first use"""
+        player = self.players.get(guild.id)
+        if player is None:
+            player = self.players[guild.id] = GuildPlayer(self, guild)
+        return player
+    
+    def clear_player(self, guild_id):
+        """Drop a guild's queue, e.g. after leaving voice"""
+        player = self.players.pop(guild_id, None)
+        if player:
+            player.clear()
     
     @commands.command(name='join')
     async def join(self, ctx):
@@ -30,7 +813,9 @@ class TTS(commands.Cog):
             await ctx.voice_client.move_to(channel)
         else:
             try:
+                start = time.perf_counter()
                 voice_client = await channel.connect()
+                connected = time.perf_counter() - start
                 self.voice_clients[ctx.guild.id] = voice_client
                 
                 embed = discord.Embed(
@@ -39,6 +824,7 @@ class TTS(commands.Cog):
                     color=0x00ff00
                 )
                 await ctx.send(embed=embed)
+                return connected  # Connect time for !tts's latency stages, without the reply above
                 
             except discord.ClientException:
                 embed = discord.Embed(
@@ -60,6 +846,8 @@ class TTS(commands.Cog):
             await ctx.send(embed=embed)
             return
         
+        self.clear_player(ctx.guild.id)
+        self.idle_timers.cancel(ctx.guild.id)
         await ctx.voice_client.disconnect()
         if ctx.guild.id in self.voice_clients:
             del self.voice_clients[ctx.guild.id]
@@ -75,10 +863,11 @@ class TTS(commands.Cog):
     async def tts(self, ctx, *, text):
         """Convert text to speech and play in voice channel"""
         # Check if bot is in voice channel
+        join_time = None
         if ctx.voice_client is None:
             # Try to join user's voice channel
             if ctx.author.voice:
-                await self.join(ctx)
+                join_time = await self.join(ctx)
             else:
                 embed = discord.Embed(
                     title="❌ No Voice Connection",
@@ -89,7 +878,7 @@ class TTS(commands.Cog):
                 return
         
         # Check text length
-        max_length = self.bot.config.get('tts_max_length', 200)
+        max_length = self.bot.config.get('tts_max_length', 1000)
         if len(text) > max_length:
             embed = discord.Embed(
                 title="❌ Text Too Long",
@@ -99,57 +888,208 @@ class TTS(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Check if already playing audio
-        if ctx.voice_client.is_playing():
+        try:
+            engine = self.get_engine(ctx.guild.id)
+        except Exception as e:
+            logging.error(f"TTS engine unavailable in {ctx.guild.name}: {e}")
             embed = discord.Embed(
-                title="⏳ Audio Playing",
-                description="Please wait for the current audio to finish.",
+                title="❌ TTS Unavailable",
+                description="The text-to-speech engine for this server is not available. Check the bot's TTS configuration.",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        # Check queue depth
+        player = self.get_player(ctx.guild)
+        max_queue = self.bot.config.get('tts_queue_max', 10)
+        if len(player.pending) >= max_queue:
+            embed = discord.Embed(
+                title="⏳ Queue Full",
+                description=f"The TTS queue is full ({max_queue} requests). Please wait for it to play.",
                 color=0xffaa00
             )
             await ctx.send(embed=embed)
             return
         
-        try:
-            # Create TTS audio
-            tts = gTTS(text=text, lang='en', slow=False)
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-                temp_filename = temp_file.name
-                tts.save(temp_filename)
-            
-            # Play audio
-            source = discord.FFmpegPCMAudio(temp_filename)
-            ctx.voice_client.play(source, after=lambda e: self.cleanup_temp_file(temp_filename, e))
-            
+        # Start rendering right away so the first chunk is ready when its turn comes
+        busy = player.current is not None or bool(player.pending)
+        chunks = split_text(text, self.bot.config.get('tts_chunk_chars', 200)) or [text]
+        request = TTSRequest(text, ctx.author, ctx.channel, chunks, lambda chunk: asyncio.create_task(self.prepare_audio(chunk, engine)), join_time)
+        player.enqueue(request)
+        
+        if busy:
+            embed = discord.Embed(
+                title="📥 TTS Queued",
+                description=f"**Text:** {text[:100]}{'...' if len(text) > 100 else ''}\n**Position:** {len(player.pending)}\n**Requested by:** {ctx.author.mention}",
+                color=0x0099ff
+            )
+        else:
             embed = discord.Embed(
                 title="🔊 Playing TTS",
                 description=f"**Text:** {text[:100]}{'...' if len(text) > 100 else ''}\n**Requested by:** {ctx.author.mention}",
                 color=0x00ff00
             )
-            await ctx.send(embed=embed)
-            
-            logging.info(f"TTS played in {ctx.guild.name} by {ctx.author}")
-            
-        except Exception as e:
-            logging.error(f"TTS error: {e}")
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='ttsqueue', aliases=['ttsq'])
+    async def tts_queue(self, ctx):
+        """Show the TTS queue for this server"""
+        player = self.players.get(ctx.guild.id)
+        if player is None or (player.current is None and not player.pending):
             embed = discord.Embed(
-                title="❌ TTS Error",
-                description="Failed to generate or play text-to-speech audio.",
-                color=0xff0000
+                title="📋 TTS Queue",
+                description="The TTS queue is empty.",
+                color=0x0099ff
             )
             await ctx.send(embed=embed)
+            return
+        
+        def describe(request):
+            status = "✅" if request.ready() else "⏳"
+            parts = f" ({len(request.chunks)} parts)" if len(request.chunks) > 1 else ""
+            return f"{status} {request.text[:60]}{'...' if len(request.text) > 60 else ''}{parts} — {request.author.mention}"
+        
+        embed = discord.Embed(
+            title="📋 TTS Queue",
+            color=0x0099ff
+        )
+        if player.current is not None:
+            embed.add_field(name="Now Playing", value=describe(player.current), inline=False)
+        if player.pending:
+            lines = [f"{i}. {describe(request)}" for i, request in enumerate(list(player.pending)[:10], 1)]
+            embed.add_field(name="Up Next", value='\n'.join(lines), inline=False)
+        embed.set_footer(text=f"{len(player.pending)}/{self.bot.config.get('tts_queue_max', 10)} queued • ✅ ready ⏳ rendering")
+        
+        await ctx.send(embed=embed)
     
     def cleanup_temp_file(self, filename, error):
-        """Clean up temporary TTS file after playback"""
+        """Clean up a temporary TTS file that never made it into the cache"""
         try:
             os.unlink(filename)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logging.error(f"Error cleaning up temp file {filename}: {e}")
         
         if error:
             logging.error(f"Audio playback error: {error}")
     
+    def playback_finished(self, error):
+        """Log playback errors (cached clips stay on disk)"""
+        if error:
+            logging.error(f"Audio playback error: {error}")
+    
+    @commands.command(name='ttsstats')
+    @commands.is_owner()
+    async def tts_stats(self, ctx):
+        """Show TTS synthesis times and event loop lag"""
+        embed = discord.Embed(
+            title="📊 TTS Statistics",
+            color=0x0099ff
+        )
+        
+        # Each synthesis used to run on the event loop, blocking it for its full duration
+        if self.synth_times:
+            avg_synth = sum(self.synth_times) / len(self.synth_times) * 1000
+            max_synth = max(self.synth_times) * 1000
+            embed.add_field(
+                name="Loop Blocking Before",
+                value=f"avg {avg_synth:.0f}ms\nmax {max_synth:.0f}ms\n(inline synthesis)",
+                inline=True
+            )
+        else:
+            embed.add_field(name="Loop Blocking Before", value="No syntheses yet", inline=True)
+        
+        # Now synthesis runs on the worker pool; this is how late the loop actually wakes up
+        lag = self.lag_monitor.summary()
+        if lag:
+            embed.add_field(
+                name="Loop Lag Now",
+                value=f"avg {lag[0] * 1000:.1f}ms\nmax {lag[1] * 1000:.1f}ms\n(last 2 minutes)",
+                inline=True
+            )
+        else:
+            embed.add_field(name="Loop Lag Now", value="No samples yet", inline=True)
+        
+        embed.add_field(
+            name="Idle Timers",
+            value=f"{len(self.idle_timers.deadlines)} armed\n1 scheduler task\n{len(asyncio.all_tasks())} loop tasks",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Synthesis",
+            value=f"{len(self.synth_times)} recent\n{self.synth_timeouts} timed out\n{self.worker_count} workers",
+            inline=True
+        )
+        
+        if self.engine_times:
+            lines = []
+            for name, times in sorted(self.engine_times.items()):
+                lines.append(f"**{name}:** avg {sum(times) / len(times) * 1000:.0f}ms, max {max(times) * 1000:.0f}ms ({len(times)} recent)")
+            embed.add_field(name="Engines", value="\n".join(lines), inline=False)
+        
+        lookups = self.cache.hits + self.cache.misses
+        hit_rate = self.cache.hits / lookups * 100 if lookups else 0
+        embed.add_field(
+            name="Audio Cache",
+            value=f"{self.cache.hits} hits / {self.cache.misses} misses ({hit_rate:.0f}%)\n"
+                  f"{len(self.cache.index)} clips, {self.cache.total_bytes / (1024 * 1024):.1f}/{self.cache.max_bytes / (1024 * 1024):.0f} MB\n"
+                  f"{self.cache.evictions} evicted",
+            inline=False
+        )
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='ttslatency')
+    @commands.is_owner()
+    async def tts_latency(self, ctx, scope: str = None):
+        """Show per-stage TTS latency for this server, or all servers with 'all'"""
+        if scope == 'all':
+            guilds = list(self.stage_latency.values())
+            title = "⏱️ TTS Latency (all servers)"
+        else:
+            guilds = [self.stage_latency.get(ctx.guild.id, {})]
+            title = f"⏱️ TTS Latency ({ctx.guild.name})"
+        
+        # Merge bucket counts across guilds, stage by stage
+        merged = {}
+        for histograms in guilds:
+            for stage, histogram in histograms.items():
+                combined = merged.setdefault(stage, RollingHistogram())
+                combined.current = [a + b for a, b in zip(combined.current, histogram.counts())]
+        
+        embed = discord.Embed(title=title, color=0x0099ff)
+        if not merged:
+            embed.description = "No TTS playback recorded in the last 10 minutes."
+            await ctx.send(embed=embed)
+            return
+        
+        def bound(value):
+            return "slower" if value == float('inf') else f"≤{value}ms"
+        
+        names = {
+            'join': "Voice Connect",
+            'synth': "Synthesis",
+            'encode': "Opus Encode",
+            'first_packet': "FFmpeg Start → First Packet",
+            'total': "Request → First Audio"
+        }
+        for stage, name in names.items():
+            histogram = merged.get(stage)
+            if histogram is None:
+                continue
+            samples = sum(histogram.counts())
+            embed.add_field(
+                name=name,
+                value=f"p50 {bound(histogram.percentile(0.5))}\np95 {bound(histogram.percentile(0.95))}\n{samples} samples",
+                inline=True
+            )
+        embed.set_footer(text="Rolling histograms over the last 10-20 minutes")
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name='stop')
     async def stop(self, ctx):
         """Stop current audio playback"""
@@ -162,11 +1102,14 @@ class TTS(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        if ctx.voice_client.is_playing():
+        # A request whose first chunk is still rendering has nothing playing yet, but would start
+        player = self.players.get(ctx.guild.id)
+        if ctx.voice_client.is_playing() or (player is not None and player.busy()):
+            self.clear_player(ctx.guild.id)
             ctx.voice_client.stop()
             embed = discord.Embed(
                 title="⏹️ Stopped Audio",
-                description="Stopped current audio playback.",
+                description="Stopped current audio playback and cleared the TTS queue.",
                 color=0x00ff00
             )
             await ctx.send(embed=embed)
@@ -248,12 +1191,13 @@ class TTS(commands.Cog):
     
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        """Handle voice state updates"""
-        # If bot is alone in voice channel, leave after 5 minutes
+        """Arm the idle-disconnect timer when the bot is left alone, cancel it when someone joins"""
+        guild = member.guild
         if member == self.bot.user:
+            if after.channel is None:
+                self.idle_timers.cancel(guild.id)
             return
         
-        guild = member.guild
         if guild.id not in self.voice_clients:
             return
         
@@ -264,16 +1208,24 @@ class TTS(commands.Cog):
         # Check if bot is alone
         members_in_channel = [m for m in voice_client.channel.members if not m.bot]
         if len(members_in_channel) == 0:
-            # Wait 5 minutes then leave if still alone
-            await asyncio.sleep(300)  # 5 minutes
-            
-            # Check again if still alone
-            members_in_channel = [m for m in voice_client.channel.members if not m.bot]
-            if len(members_in_channel) == 0 and voice_client.is_connected():
-                await voice_client.disconnect()
-                if guild.id in self.voice_clients:
-                    del self.voice_clients[guild.id]
-                logging.info(f"Left voice channel in {guild.name} due to inactivity")
+            if not self.idle_timers.is_armed(guild.id):
+                self.idle_timers.arm(guild.id, self.bot.config.get('tts_idle_timeout', 300))
+        else:
+            self.idle_timers.cancel(guild.id)
+    
+    async def disconnect_if_idle(self, guild_id):
+        """Leave voice when a guild's idle timer fires and the bot is still alone"""
+        voice_client = self.voice_clients.get(guild_id)
+        if not voice_client or not voice_client.channel or not voice_client.is_connected():
+            self.voice_clients.pop(guild_id, None)
+            return
+        
+        members_in_channel = [m for m in voice_client.channel.members if not m.bot]
+        if len(members_in_channel) == 0:
+            self.clear_player(guild_id)
+            await voice_client.disconnect()
+            self.voice_clients.pop(guild_id, None)
+            logging.info(f"Left voice channel in {voice_client.guild.name} due to inactivity")
 
 async def setup(bot):
     await bot.add_cog(TTS(bot))
@@ -274,6 +274,19 @@ class Utility(commands.Cog):
         embed.add_field(name="Memory Usage", value=f"{memory_used}/{memory_total} ({memory_percent}%)", inline=True)
         embed.add_field(name="Ping", value=f"{round(self.bot.latency * 1000)}ms", inline=True)
         
+        # Audio subprocesses (FFmpeg and local TTS engines)
+        tts = self.bot.get_cog('TTS')
+        if tts:
+            audio = tts.audio_budget.usage()
+            lines = [
+                f"{audio['active']}/{audio['max_processes']} running, {audio['waiting']} queued",
+                f"{audio['rss'] / (1024**2):.0f}/{audio['max_rss'] / (1024**2):.0f} MB RSS, {audio['cpu_percent']:.0f}% CPU",
+                f"{audio['started']} started, {audio['queued']} had to wait"
+            ]
+            for name, pid, rss, cpu in sorted(audio['processes'], key=lambda row: row[2], reverse=True)[:5]:
+                lines.append(f"`{name}` ({pid}): {rss / (1024**2):.1f} MB, {cpu:.0f}% CPU")
+            embed.add_field(name="Audio Processes", value="\n".join(lines), inline=False)
+        
         embed.set_footer(text=f"Bot ID: {self.bot.user.id}")
         
         await ctx.send(embed=embed)